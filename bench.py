@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# Times each stage of process.py on synthetic surveys of increasing size and
+# saves the results as JSON, so a change can be compared against the commit
+# before it:
+#
+#   ./bench.py --rows 1000,100000 --out before.json
+#   (make the change)
+#   ./bench.py --rows 1000,100000 --out after.json --compare before.json
+#
+# Every size runs in a fresh process, so peak memory is that size's alone.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import functools
+import subprocess
+import numpy as np
+
+import process
+import gen_survey
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def clear_answer_caches():
+    process.clean_age.cache_clear()
+    process.clean_age_range.cache_clear()
+
+def split_rows(fname):
+    # Just reading the file into fields, with no cleaning.
+    n = 0
+    with open(fname, "rb") as inf:
+        schema = process.Schema(process.split_line(inf.readline()))
+        for line_number, line in enumerate(inf, 2):
+            schema.fields(process.split_line(line), line_number)
+            n += 1
+    return n
+
+def figure_families():
+    # family -> figure names, where the family is the name up to any colon
+    families = {}
+    for name in process.figure_needs:
+        families.setdefault(name.split(":")[0], []).append(name)
+    return families
+
+def run_case(fname, workers, figures, outdir):
+    # Runs every stage on fname in this process.  Returns a list of
+    # {stage, seconds, peak_rss_mb}.
+    results = []
+
+    def timed(stage, f, *args, **kwargs):
+        start = time.perf_counter()
+        value = f(*args, **kwargs)
+        results.append({
+            "stage": stage,
+            "seconds": time.perf_counter() - start,
+            "peak_rss_mb": process.peak_rss_mb(),
+        })
+        return value
+
+    timed("parse", split_rows, fname)
+    for n in workers:
+        clear_answer_caches()
+        records, aggregates, end = timed(
+            "parse+clean@%s" % n, process.stream_responses, fname, workers=n)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        timed("cache:write", process.read_cached, fname, cache_dir)
+        timed("cache:load", process.read_cached, fname, cache_dir)
+
+    scores = timed("zscore", process.add_scores, records, aggregates)
+    timed("percentiles", process.add_percentiles, records)
+    records.columns["highlight"] = timed(
+        "highlights", process.find_highlights, records)
+
+    def group_by():
+        for variable in ["childhood_area", "area", "oldest", "n_children",
+                         "gender", "is_parent", "age"]:
+            for skip_nan in [False, True]:
+                process.factor_groups(
+                    records, variable, skip_nan).values(scores.mean_zscore)
+    timed("group-by", group_by)
+
+    timed("bootstrap", process.group_intervals, records,
+          functools.partial(process.bootstrap_means, resamples=1000))
+    timed("permutation", process.factor_tests, records,
+          functools.partial(process.permutation_tests, permutations=1000))
+
+    def export():
+        with open(os.devnull, "w") as outf:
+            process.write_export(outf, records)
+    timed("export", export)
+
+    if figures:
+        survey = process.Survey(records, aggregates, resamples=0)
+        for family, names in figure_families().items():
+            timed("figures:%s" % family, process.render_figures,
+                  process.figure_jobs(survey, names),
+                  1, 0, outdir)
+
+    return results
+
+def best_time(command, repeat=5):
+    # Fastest of `repeat` runs of command, in seconds: startup is short
+    # enough that the minimum is the least noisy measure.
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True, cwd=here)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def startup_times(fname):
+    # How long importing process.py takes, beyond starting Python, and a
+    # whole --stats-only run on fname.
+    interpreter = best_time([sys.executable, "-c", "pass"])
+    return [
+        ("import", best_time([sys.executable, "-c", "import process"]) -
+         interpreter),
+        ("stats-only", best_time(
+            [sys.executable, "process.py", os.path.abspath(fname),
+             "--stats-only"])),
+    ]
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=here, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    # baseline: results from an earlier run, to compare against
+    before = {}
+    for result in baseline or []:
+        before[result["rows"], result["stage"]] = result["seconds"]
+    print("%10s  %-34s %9s %12s %9s%s" % (
+        "rows", "stage", "seconds", "rows/s", "peak MB",
+        "    before  change" if baseline else ""))
+    for result in results:
+        line = "%10s  %-34s %9.3f %12.0f %9s" % (
+            result["rows"], result["stage"], result["seconds"],
+            result["rows_per_second"],
+            "" if result["peak_rss_mb"] is None else
+            "%.1f" % result["peak_rss_mb"])
+        old = before.get((result["rows"], result["stage"]))
+        if old:
+            line += "  %8.3f %+6.0f%%" % (
+                old, 100 * (result["seconds"] - old) / old)
+        if "speedup" in result:
+            line += "  %.2fx" % result["speedup"]
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark process.py on synthetic surveys.")
+    parser.add_argument(
+        "--rows", default="1000,10000,100000",
+        help="comma-separated survey sizes (default: %(default)s)")
+    parser.add_argument(
+        "--jobs", default="1,%s" % os.cpu_count(),
+        help="comma-separated worker counts to parse with, to measure "
+             "speedup (default: %(default)s)")
+    parser.add_argument(
+        "--no-figures", action="store_true",
+        help="skip rendering, which dominates at large sizes")
+    parser.add_argument(
+        "--workdir", default="bench-data",
+        help="where to keep generated surveys and figures; surveys are "
+             "reused across runs (default: %(default)s)")
+    parser.add_argument(
+        "--out", default="bench.json",
+        help="where to save the results (default: %(default)s)")
+    parser.add_argument(
+        "--compare", metavar="JSON",
+        help="results of an earlier run to show changes against")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workers = sorted(set(int(n) for n in args.jobs.split(",")))
+    figures_dir = os.path.join(args.workdir, "figures")
+
+    if args.case:
+        # Run by ourselves below, once per size.
+        json.dump(run_case(args.case, workers, not args.no_figures,
+                           figures_dir), sys.stdout)
+        return
+
+    os.makedirs(figures_dir, exist_ok=True)
+    results = []
+    for rows in [int(n) for n in args.rows.split(",")]:
+        fname = os.path.join(args.workdir, "survey-%s.tsv" % rows)
+        if not os.path.exists(fname):
+            start = time.perf_counter()
+            with open(fname + ".tmp", "w") as outf:
+                gen_survey.write_survey(outf, rows, gen_survey.default_mix)
+            os.replace(fname + ".tmp", fname)
+            print("Generated %s rows in %.1fs" % (
+                rows, time.perf_counter() - start), file=sys.stderr)
+
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--case", fname, "--jobs", args.jobs,
+                   "--workdir", args.workdir]
+        if args.no_figures:
+            command.append("--no-figures")
+        case = json.loads(subprocess.run(
+            command, stdout=subprocess.PIPE, check=True).stdout)
+        for stage, seconds in startup_times(fname):
+            case.append({"stage": "startup:" + stage, "seconds": seconds,
+                         "peak_rss_mb": None})
+        for result in case:
+            result["rows"] = rows
+            result["rows_per_second"] = rows / max(result["seconds"], 1e-9)
+        results.extend(case)
+
+        serial = [result["seconds"] for result in case
+                  if result["stage"] == "parse+clean@%s" % workers[0]]
+        for result in case:
+            if result["stage"].startswith("parse+clean@") and serial:
+                result["speedup"] = serial[0] / max(result["seconds"], 1e-9)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as inf:
+            baseline = json.load(inf)["results"]
+    print_results(results, baseline)
+
+    with open(args.out, "w") as outf:
+        json.dump({
+            "commit": git_commit(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "results": results,
+        }, outf, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Writes a synthetic survey export with the same columns as the real one, for
+# measuring process.py at sizes we don't have real data for.  Answers come
+# from a simple model -- each question has a typical age, each respondent a
+# degree of caution -- and are written in the mix of styles people actually
+# used: plain numbers, ranges, months or weeks, "never", and non-answers.
+
+import sys
+import argparse
+import numpy as np
+
+from process import (
+    questions, demographics, clarify_column, area_categories,
+    n_children_categories, gender_categories)
+
+# Roughly the mean typical age we see for each question.
+question_ages = {
+    'home_15min': 8,
+    'home_3hr': 11,
+    'home_night': 14,
+    'street_low': 7,
+    'street_medium': 9,
+    'street_busy': 11,
+    'school': 9,
+    'backyard': 5,
+    'frontyard': 6,
+    'sidewalk': 6,
+    'playground': 9,
+    'transit': 12,
+    'bike': 8,
+}
+
+# How answers are written, in the order of the proportions below.
+NUMERIC, RANGED, UNITS, NEVER, NA = range(5)
+styles = ["numeric", "ranged", "units", "never", "na"]
+default_mix = [0.83, 0.05, 0.02, 0.02, 0.08]
+
+# Ways of not giving an age, all of which process.py reads as NaN.
+na_answers = ["", "N/A", "Depends on the kid", "I don’t know"]
+
+min_age, max_age = 1, 18
+
+def answer_tables():
+    # style -> typical age -> (typical answer, age range answer), so each
+    # cell is a lookup rather than string formatting.
+    ages = range(max_age + 1)
+    typical = np.empty((len(styles), max_age + 1), dtype=object)
+    ranges = np.empty((len(styles), max_age + 1), dtype=object)
+    for age in ages:
+        typical[NUMERIC, age] = "%s" % age
+        ranges[NUMERIC, age] = "%s-%s" % (max(age - 1, 0), age + 2)
+        typical[RANGED, age] = "%s-%s" % (max(age - 1, 0), age + 1)
+        ranges[RANGED, age] = "%s to %s" % (age, age + 3)
+        typical[UNITS, age] = (
+            "%s months" % (age * 12) if age < 4 else "%s years" % age)
+        ranges[UNITS, age] = "%s+" % age
+        typical[NEVER, age] = "never"
+        ranges[NEVER, age] = "never"
+    return typical, ranges
+
+def write_survey(outf, n_rows, mix, seed=0, block_size=10000):
+    # mix: proportion of answers in each of `styles`
+    rng = np.random.default_rng(seed)
+    typical_table, range_table = answer_tables()
+    na_table = np.array(na_answers, dtype=object)
+    base_ages = np.array([question_ages[slug] for slug in questions])
+    areas = first_answers(area_categories)
+    n_childrens = first_answers(n_children_categories)
+    genders = first_answers(gender_categories)
+
+    outf.write("\t".join(
+        ["Timestamp"] + list(demographics.values()) +
+        list(questions.values()) + [clarify_column] +
+        list(questions.values()) + ["Other"]) + "\n")
+
+    for start in range(0, n_rows, block_size):
+        n = min(block_size, n_rows - start)
+
+        # process.py groups respondents' ages from 25 up.
+        age = np.clip(rng.normal(38, 7, n), 25, 75).round().astype(int)
+        n_children = rng.choice(
+            len(n_childrens), n, p=[0.15, 0.25, 0.35, 0.15, 0.06, 0.04])
+        oldest = np.where(
+            n_children > 0, rng.uniform(0, 1, n) * (age - 20), np.nan)
+        area = rng.choice(len(areas), n, p=[
+            0.08, 0.25, 0.25, 0.05, 0.02, 0.02, 0.23, 0.02, 0.04, 0.04])
+        childhood_area = rng.choice(len(areas), n, p=[
+            0.03, 0.12, 0.2, 0.1, 0.02, 0.03, 0.35, 0.02, 0.07, 0.06])
+        gender = rng.choice(len(genders) + 1, n, p=[0.3, 0.6, 0.05, 0.05])
+
+        caution = rng.normal(0, 1, (n, 1))
+        typical = np.clip(
+            base_ages + 1.5 * caution + rng.normal(0, 1.2, (n, len(questions))),
+            min_age, max_age).round().astype(int)
+        style = rng.choice(len(styles), (n, len(questions)), p=mix)
+        na = rng.integers(len(na_answers), size=(n, len(questions)))
+        typical_answers = np.where(
+            style == NA, na_table[na], typical_table[style, typical])
+        range_answers = np.where(
+            style == NA, na_table[na], range_table[style, typical])
+
+        for i in range(n):
+            outf.write("\t".join([
+                "5/1/2023 12:00:00",
+                "%s" % age[i],
+                "" if np.isnan(oldest[i]) else
+                "%s months" % int(oldest[i] * 12) if oldest[i] < 2 else
+                "%s" % int(oldest[i]),
+                areas[area[i]],
+                areas[childhood_area[i]],
+                n_childrens[n_children[i]],
+                genders[gender[i]] if gender[i] < len(genders) else "",
+                *typical_answers[i],
+                "",
+                *range_answers[i],
+                "",
+            ]) + "\n")
+
+def first_answers(categories):
+    # Every answer we recognize for a multiple-choice question, in order.
+    return np.array(list(categories.codes), dtype=object)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic parenting survey export.")
+    parser.add_argument("rows", type=int, help="how many respondents")
+    parser.add_argument(
+        "-o", "--output", help="where to write it (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0)
+    for style, default in zip(styles[1:], default_mix[1:]):
+        parser.add_argument(
+            "--" + style, type=float, default=default,
+            help="proportion of answers written this way (default: "
+                 "%(default)s); the rest are plain numbers")
+    args = parser.parse_args()
+
+    rest = [getattr(args, style) for style in styles[1:]]
+    if min(rest) < 0 or sum(rest) > 1:
+        parser.error("proportions must be between 0 and 1 and sum to at "
+                     "most 1")
+    mix = [1 - sum(rest)] + rest
+
+    if args.output:
+        with open(args.output, "w") as outf:
+            write_survey(outf, args.rows, mix, args.seed)
+    else:
+        write_survey(sys.stdout, args.rows, mix, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,124 @@
 #!/usr/bin/env python3
+import os
 import sys
 import re
+import json
+import math
+import time
+import contextlib
+import resource
+import argparse
+import functools
+import operator
+import warnings
 import numpy as np
-import scipy
-from collections import defaultdict, Counter
+
+# Modules only some stages need (multiprocessing, tracemalloc, hashlib,
+# inspect, and above all matplotlib) are imported where they're used, so a
+# --stats-only run doesn't pay for them.
+from collections import defaultdict, namedtuple, Counter
+from collections.abc import Mapping
+
+# Answers that mean "no usable age", either exactly or as a prefix.
+na_answers = frozenset([
+    "N/A", "N/a", "N/a--none here", "100", "110",
+    "I do not trust drivers in Somerville.",
+    "With a friend 12 Alone, unsure when he'll feel ready.",
+    "We don't have a sidewalk very close to our house",
+    "Depend on the kid maybe, depending on yard and traffic",
+])
+na_prefixes = (
+    "The age where they can",
+    "Different for each of these",
+    "Wouldn’t",
+    "still in utero",
+    "No sidewalk",
+    "no sidewak",
+    "no public transit",
+    "I don’t know",
+    "Depends on",
+    "legally set at 8 in my state",
+    "depends on",
+    "10? 12? so few good options here.",
+    "ha. if only they'd learned.",
+    "I don't understand this question",
+    "2I don't understand this question",
+    "with supervision, like 4",
+)
+
+# Applied in order, so a rule sees the output of the rules before it.
+age_replacements = [
+    # Handle verbose answers
+    ("8 for our neighborhood, 6-7 for a more suburban area ",
+     "8"),
+    ("12 ? Depends on which one! I do feel like it depends on the "
+     "particular street as I think there are good and bad crossings. Ie "
+     "busy roads by highways: super dangerous; Memorial Drive — is fast "
+     "but crossings close to Harvard Sq are pretty safe for peds.",
+     "12"),
+    (
+        "I’m assuming this is unsupervised? I’m having trouble "
+        "imaging an unfenced backyard in my neighborhood. Depends "
+        "on kkd if you’re worried they’ll wander off! 3? 4? My kid "
+        "would never wander off but I know kids who are runners",
+        "3"),
+    ("I do not trust drivers in Somerville. 8", "8"),
+    ("8 except I do not trust drivers in Somerville.", "8"),
+    ("8, depends on if other adults are known to be present", "8"),
+    ("10 but more dependent on neighborhood than child", "10"),
+    ("6. This is also the legal minimum age where I live", "6"),
+    ("9 due to threat of CPS; 8 due to threat of stranger danger. "
+     "I'd let a younger child play in neighborhood woods alone.", "8"),
+    ("7 if w/in quarter mile, 9 if more like a mile", "9"),
+    ("8, but I’m not sure my kid would be ready", "8"),
+    ("12 depends on kid and environment", "12"),
+    ("12 depends on neighborhood", "12"),
+    ('7 with a crosswalk signal', "7"),
+    # remove qualifiers
+    ("(unsupervised, you mean?)", ""),
+    ("Wildly child dependent.", ""),
+    ("almost ", ""),
+    (", but depends", ""),
+    # I'm interpreting "never" to mean "not while they're a kid"
+    ("I think of McGrath and say never", "18"),
+    ("Never — this is not something I believe to be appropriate",
+    "18"),
+    ("never", "18"),
+    ("no", "18"),
+    # alterantive ways of writing things
+    ("/", "-"),
+    ("⁷", "7"),
+    # treat 8+ etc as 8
+    ("+", ""),
+    # remove uncertainty markers
+    ("?", ""),
+]
+
+# One pass over the answer finds whether any NA prefix or replacement applies
+# at all.  Most answers are plain numbers and match nothing, so they skip the
+# rule tables entirely.  When something does match we still apply the
+# replacements one by one: later rules can depend on earlier ones ("almost
+# never" -> "never" -> "18"), which a single regex substitution would miss.
+na_prefix_re = re.compile("|".join(re.escape(x) for x in na_prefixes))
+age_replacement_re = re.compile(
+    "|".join(re.escape(f) for f, r in age_replacements))
+
+# Free-text answers repeat heavily ("8", "10", "N/A"), so clean each distinct
+# string once.
+answer_cache_size = 1 << 16
 
 def is_na(s):
     s = s.strip()
-    return not s or s in [
-        "N/A", "N/a", "N/a--none here", "100", "110",
-        "I do not trust drivers in Somerville.",
-        "With a friend 12 Alone, unsure when he'll feel ready.",
-        "We don't have a sidewalk very close to our house",
-        "Depend on the kid maybe, depending on yard and traffic",
-    ] or any(
-        s.startswith(x) for x in [
-            "The age where they can",
-            "Different for each of these",
-            "Wouldn’t",
-            "still in utero",
-            "No sidewalk",
-            "no sidewak",
-            "no public transit",
-            "I don’t know",
-            "Depends on",
-            "legally set at 8 in my state",
-            "depends on",
-            "10? 12? so few good options here.",
-            "ha. if only they'd learned.",
-            "I don't understand this question",
-            "2I don't understand this question",
-            "with supervision, like 4",
-        ])
+    return not s or s in na_answers or na_prefix_re.match(s) is not None
 
+@functools.lru_cache(maxsize=answer_cache_size)
 def clean_age(s):
     if is_na(s):
         return float('nan')
 
-    for f, r in [
-            # Handle verbose answers
-            ("8 for our neighborhood, 6-7 for a more suburban area ",
-             "8"),
-            ("12 ? Depends on which one! I do feel like it depends on the "
-             "particular street as I think there are good and bad crossings. Ie "
-             "busy roads by highways: super dangerous; Memorial Drive — is fast "
-             "but crossings close to Harvard Sq are pretty safe for peds.",
-             "12"),
-            (
-                "I’m assuming this is unsupervised? I’m having trouble "
-                "imaging an unfenced backyard in my neighborhood. Depends "
-                "on kkd if you’re worried they’ll wander off! 3? 4? My kid "
-                "would never wander off but I know kids who are runners",
-                "3"),
-            ("I do not trust drivers in Somerville. 8", "8"),
-            ("8 except I do not trust drivers in Somerville.", "8"),
-            ("8, depends on if other adults are known to be present", "8"),
-            ("10 but more dependent on neighborhood than child", "10"),
-            ("6. This is also the legal minimum age where I live", "6"),
-            ("9 due to threat of CPS; 8 due to threat of stranger danger. "
-             "I'd let a younger child play in neighborhood woods alone.", "8"),
-            ("7 if w/in quarter mile, 9 if more like a mile", "9"),
-            ("8, but I’m not sure my kid would be ready", "8"),
-            ("12 depends on kid and environment", "12"),
-            ("12 depends on neighborhood", "12"),
-            ('7 with a crosswalk signal', "7"),
-            # remove qualifiers
-            ("(unsupervised, you mean?)", ""),
-            ("Wildly child dependent.", ""),
-            ("almost ", ""),
-            (", but depends", ""),
-            # I'm interpreting "never" to mean "not while they're a kid"
-            ("I think of McGrath and say never", "18"),
-            ("Never — this is not something I believe to be appropriate",
-            "18"),
-            ("never", "18"),
-            ("no", "18"),
-            # alterantive ways of writing things
-            ("/", "-"),
-            ("⁷", "7"),
-            # treat 8+ etc as 8
-            ("+", ""),
-            # remove uncertainty markers
-            ("?", ""),
-    ]:
-        s = s.replace(f, r)
+    if age_replacement_re.search(s):
+        for f, r in age_replacements:
+            s = s.replace(f, r)
     s = re.sub(" [(].*[)]$", "", s)
     s = s.strip()
     if "-" in s:
@@ -98,6 +133,7 @@ def clean_age(s):
         s = s.replace(" years old", "")
     return float(s)
 
+@functools.lru_cache(maxsize=answer_cache_size)
 def clean_age_range(s):
     s = s.replace("5-10 (for ~0.25 mile), 7-12 (for ~1 mile)", "7-12")
     if is_na(s):
@@ -110,43 +146,236 @@ def clean_age_range(s):
     early, late = s.split("-")
     return clean_age(early.strip()), clean_age(late.strip())
 
-def clean_area(s):
-    if not s:
-        return None
-    if s in ["Very Urban (tall buildings, no driveways)"]:
-        return 1, "very urban"
-    if s in ["Moderately Urban (parking is a pain)"]:
-        return 2, "moderately urban"
-    if s in ["Slightly Urban (multi-family housing is common)",
-             "Small town",
-             "Small Town which is walkable unless you want to leave town",
-             "Medium town; mostly single-family housing, but schools, shops, "
-             "restaurants and other destinations are walkable and bikeable"]:
-        return 3, "slightly urban"
-    if s in [
-            "Suburban (almost all single-family housing, few places to go "
-            "without driving)",
-            "Suburban, but a deliberate cluster of families so many places "
-            "to go by feet or bike"]:
-        return 4, "suburban"
-    if s in ["Exurban (houses widely spaced, you need a car)"]:
-        return 5, "exurban"
-    if s in ["Rural (houses very far from other houses)"]:
-        return 6, "rural"
-    raise Exception("Unknown area %r" % s)
-
-def clean_n_children(s):
-    if not s: return None
-    if s == "I don't have children":
-        return "0"
-    return s
-
-def clean_gender(s):
-    if not s:
-        return None
-    return s
+def answer_cache_info():
+    counts = Counter()
+    for f in [clean_age, clean_age_range]:
+        info = f.cache_info()
+        counts["hits"] += info.hits
+        counts["misses"] += info.misses
+    return counts
+
+# Cache hits and misses from parse_range, wherever it ran.
+answer_cache_counts = Counter()
+
+def answer_cache_report():
+    hits = answer_cache_counts["hits"]
+    misses = answer_cache_counts["misses"]
+    return "Answer cache: %s lookups, %s misses, %.0f%% hits" % (
+        hits + misses, misses, 100 * hits / max(hits + misses, 1))
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024
+    return peak / (1 << 20)
+
+def memory_report():
+    return "Peak memory so far: %.1f MB" % peak_rss_mb()
+
+class Profile:
+    # Named spans of work, each with how long it took in wall and CPU time,
+    # the most memory Python had allocated during it (when tracing memory)
+    # and how many rows it handled.  Spans nest, and spans recorded in
+    # worker processes are merged in under the span that started them.
+
+    def __init__(self, memory=True, worker=False):
+        import tracemalloc
+        self.memory = memory
+        self.worker = worker
+        self.start = time.perf_counter()
+        self.events = []  # finished spans
+        self.stack = []   # open spans, outermost first
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def span(self, name, rows=None):
+        import tracemalloc
+        event = {"name": name, "pid": os.getpid(), "depth": len(self.stack),
+                 "rows": rows, "peak": 0}
+        if self.memory:
+            # The traced peak is reset for each span, so fold what the
+            # enclosing span has seen so far into it first.
+            if self.stack:
+                self.stack[-1]["peak"] = max(
+                    self.stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(event)
+        cpu = time.process_time()
+        event["start"] = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event["wall"] = time.perf_counter() - event["start"]
+            event["cpu"] = time.process_time() - cpu
+            self.stack.pop()
+            if self.memory:
+                event["peak"] = max(
+                    event["peak"], tracemalloc.get_traced_memory()[1])
+                if self.stack:
+                    self.stack[-1]["peak"] = max(
+                        self.stack[-1]["peak"], event["peak"])
+            else:
+                event["peak"] = None
+            self.events.append(event)
+
+    def drain(self):
+        # Finished spans, for a worker process to hand back with its results.
+        events, self.events = self.events, []
+        return events
+
+    def extend(self, events):
+        # Spans from drain(), nested under whatever span is open here.
+        for event in events:
+            event["depth"] += len(self.stack)
+            if self.stack and self.memory and event["peak"] is not None:
+                self.stack[-1]["peak"] = max(
+                    self.stack[-1]["peak"], event["peak"])
+            self.events.append(event)
+
+    def report(self):
+        # One line per span name, in the order they first started, with
+        # repeated spans (chunks, savefig) added up.
+        totals = {}
+        for event in sorted(self.events, key=lambda event: event["start"]):
+            total = totals.setdefault(event["name"], {
+                "depth": event["depth"], "count": 0, "wall": 0, "cpu": 0,
+                "peak": event["peak"], "rows": None})
+            total["depth"] = min(total["depth"], event["depth"])
+            total["count"] += 1
+            total["wall"] += event["wall"]
+            total["cpu"] += event["cpu"]
+            if event["peak"] is not None:
+                total["peak"] = max(total["peak"], event["peak"])
+            if event["rows"] is not None:
+                total["rows"] = (total["rows"] or 0) + event["rows"]
+        lines = ["%-58s %5s %9s %9s %10s %10s" % (
+            "span", "count", "wall", "cpu", "peak MB", "rows")]
+        for name, total in totals.items():
+            lines.append("%-58s %5s %8.3fs %8.3fs %10s %10s" % (
+                "  " * total["depth"] + name, total["count"], total["wall"],
+                total["cpu"],
+                "" if total["peak"] is None else
+                "%.1f" % (total["peak"] / (1 << 20)),
+                "" if total["rows"] is None else total["rows"]))
+        return "\n".join(lines)
+
+    def write_trace(self, outf):
+        # Chrome trace-event JSON, for chrome://tracing or Perfetto.
+        json.dump({"traceEvents": [{
+            "name": event["name"],
+            "ph": "X",
+            "ts": 1e6 * (event["start"] - self.start),
+            "dur": 1e6 * event["wall"],
+            "pid": event["pid"],
+            "tid": event["pid"],
+            "args": {
+                "cpu_ms": 1e3 * event["cpu"],
+                "peak_bytes": event["peak"],
+                "rows": event["rows"],
+            },
+        } for event in self.events], "displayTimeUnit": "ms"}, outf)
+
+# The Profile for --profile, or None.  Spans cost little more than a
+# function call when it's None.
+profile = None
+
+def span(name, rows=None):
+    # with span("stage") as event: ... event["rows"] = n
+    if profile is None:
+        # A dict of its own, so what one span writes isn't seen by another.
+        return contextlib.nullcontext({})
+    return profile.span(name, rows)
+
+def worker_spans():
+    # Spans to send back from a worker process.  In the main process
+    # they're already where they belong.
+    if profile is None or not profile.worker:
+        return []
+    return profile.drain()
+
+def start_worker(profiling, memory=False, plotting=False):
+    # Runs first in each worker process.  Forked workers would otherwise
+    # inherit our Profile, spans and all.
+    global profile
+    profile = Profile(memory, worker=True) if profiling else None
+    if plotting:
+        pyplot()
+
+def worker_options():
+    return (profile is not None, profile is not None and profile.memory)
+
+MISSING = -1
+
+class Categories:
+    # Encodes multiple-choice answers as small integer codes.  Built from
+    # (label, answers) pairs: code n means labels[n], and is what we store for
+    # each of the answers listed with it.  Empty answers are MISSING.
+
+    def __init__(self, categories):
+        self.labels = [label for label, answers in categories]
+        self.codes = {
+            answer: code
+            for code, (label, answers) in enumerate(categories)
+            for answer in answers}
+
+    def encode(self, s, unknown, line_number):
+        # Answers we don't recognize are noted in `unknown` (answer -> line
+        # numbers) and stored as MISSING, so a whole file can be checked in
+        # one pass.
+        if not s:
+            return MISSING
+        code = self.codes.get(s)
+        if code is None:
+            unknown.setdefault(s, []).append(line_number)
+            return MISSING
+        return code
+
+    def label(self, code):
+        return None if code == MISSING else self.labels[code]
+
+area_categories = Categories([
+    ((1, "very urban"), ["Very Urban (tall buildings, no driveways)"]),
+    ((2, "moderately urban"), ["Moderately Urban (parking is a pain)"]),
+    ((3, "slightly urban"), [
+        "Slightly Urban (multi-family housing is common)",
+        "Small town",
+        "Small Town which is walkable unless you want to leave town",
+        "Medium town; mostly single-family housing, but schools, shops, "
+        "restaurants and other destinations are walkable and bikeable"]),
+    ((4, "suburban"), [
+        "Suburban (almost all single-family housing, few places to go "
+        "without driving)",
+        "Suburban, but a deliberate cluster of families so many places "
+        "to go by feet or bike"]),
+    ((5, "exurban"), ["Exurban (houses widely spaced, you need a car)"]),
+    ((6, "rural"), ["Rural (houses very far from other houses)"]),
+])
+
+n_children_categories = Categories([
+    ("0", ["I don't have children"]),
+    ("1", ["1"]),
+    ("2", ["2"]),
+    ("3", ["3"]),
+    ("4", ["4"]),
+    ("5+", ["5+"]),
+])
+
+gender_categories = Categories([
+    ("Male", ["Male"]),
+    ("Female", ["Female"]),
+    ("Non-binary", ["Non-binary"]),
+])
+
+# column -> how it's encoded
+categorical = {
+    "area": area_categories,
+    "childhood_area": area_categories,
+    "n_children": n_children_categories,
+    "gender": gender_categories,
+}
 
-fname, = sys.argv[1:]
 questions = {
     'home_15min': 'Spend fifteen minutes home alone',
     'home_3hr': 'Spend three hours home alone',
@@ -164,147 +393,642 @@ questions = {
     'bike':'Bike, scooter, or skate around the neighborhood',
 }
 
-# question -> age -> count
-typicals = defaultdict(Counter)
-earlies = defaultdict(Counter)
-lates = defaultdict(Counter)
-
-# question -> ages
-typicals_list = defaultdict(list)
-
-# records
-#   {
-#      age,
-#      questions, # question -> typical, early, late
-#   }
-records = []
-
-with open(fname) as inf:
-    cols = None
+demographics = {
+    'age': "What's your age?",
+    'oldest': "How old is your oldest child, if you have one?",
+    'area': "How would you describe your area?",
+    'childhood_area':
+        "How would you describe the area where you grew up? (If multiple, "
+        "where you spent the majority of your time from 5-13)",
+    'n_children': "How many children do you have, if any?",
+    'gender': "What's your gender?",
+}
 
-    for line in inf:
-        record = {}
+# Typical ages come before this column, age ranges after it.
+clarify_column = "Anything you'd like to clarify about your answers above?"
+
+class Schema:
+    # Resolves every column we read to a position once, from the header, so
+    # each row is a single fixed-position lookup instead of a header scan per
+    # field.
+    #
+    # Schema(cols).get(row) returns the demographics (in the order of
+    # `demographics`), then the typical age for each question, then the age
+    # range for each question (both in the order of `questions`).
+
+    def __init__(self, cols):
+        def find(s, start, end):
+            matches = [i for i in range(start, end) if cols[i] == s]
+            if not matches:
+                raise Exception("Missing column %r" % s)
+            if len(matches) > 1:
+                raise Exception("Duplicate column %r at positions %s" % (
+                    s, ", ".join(str(i) for i in matches)))
+            return matches[0]
+
+        clarify = find(clarify_column, 0, len(cols))
+        self.demographics = {
+            slug: find(col, 0, len(cols))
+            for slug, col in demographics.items()}
+        self.typicals = {
+            slug: find(question_value, 0, clarify)
+            for slug, question_value in questions.items()}
+        self.ranges = {
+            slug: find(question_value, clarify + 1, len(cols))
+            for slug, question_value in questions.items()}
+
+        positions = (list(self.demographics.values()) +
+                     list(self.typicals.values()) +
+                     list(self.ranges.values()))
+        self.width = max(positions) + 1
+        self.get = operator.itemgetter(*positions)
+
+    def fields(self, row, line_number):
+        if len(row) < self.width:
+            raise Exception("Line %s has %s columns, expected at least %s" % (
+                line_number, len(row), self.width))
+        return self.get(row)
+
+# Per respondent and question we store these, in this order.
+fields = ["typical", "mature", "immature", "zscore", "years_above_mean",
+          "percentile"]
+TYPICAL, MATURE, IMMATURE, ZSCORE, YEARS_ABOVE_MEAN, PERCENTILE = range(
+    len(fields))
+
+question_index = {slug: q for q, slug in enumerate(questions)}
+
+# The per-respondent columns read from the file; the rest are derived.
+parsed_columns = [
+    "age", "oldest", "area", "childhood_area", "n_children", "gender"]
+
+class Responses:
+    # The cleaned survey, stored by column:
+    #
+    #   answers: respondents x questions x (typical, mature, immature) float
+    #            array, NaN if missing
+    #   scored: field -> respondents x questions float array, for the fields
+    #           after IMMATURE that have been computed (see add_scores and
+    #           add_percentiles)
+    #   columns: name -> one entry per respondent (age, oldest, area, ...);
+    #            categorical columns hold codes, see `categorical`
+    #
+    # Indexing or iterating gives Record views, so code can keep using
+    # record["age"] and record["questions"][slug][TYPICAL] without anything
+    # being copied into per-respondent dicts.
+
+    def __init__(self, answers, columns, scored=None):
+        self.answers = answers
+        self.columns = columns
+        self.scored = scored or {}
+        # see per_responses
+        self.cache = {}
+
+    @classmethod
+    def from_answers(cls, answers, columns):
+        # answers: respondents x questions x (typical, mature, immature)
+        # columns: the parsed demographic columns
+        columns = dict(columns)
+        n_children = columns["n_children"]
+        columns["is_parent"] = np.where(
+            n_children == MISSING, np.nan, np.where(n_children == 0, 2, 1))
+        return cls(answers, columns)
+
+    @classmethod
+    def empty(cls, n):
+        # (answers, columns) for n respondents, to be filled in and passed
+        # to from_answers.
+        columns = {name: np.empty(n, dtype=np.int8 if name in categorical
+                                  else float)
+                   for name in parsed_columns}
+        return np.empty((n, len(questions), IMMATURE + 1)), columns
+
+    @classmethod
+    def concatenate(cls, parts):
+        return cls.from_answers(
+            np.concatenate([part.answers for part in parts]),
+            {name: np.concatenate([part.columns[name] for part in parts])
+             for name in parsed_columns})
+
+    def __len__(self):
+        return len(self.answers)
+
+    def __getitem__(self, i):
+        return Record(self, i)
+
+    def __iter__(self):
+        return (Record(self, i) for i in range(len(self)))
+
+    def field(self, field):
+        # respondents x questions
+        if field <= IMMATURE:
+            return self.answers[:, :, field]
+        return self.scored[field]
+
+    def question(self, question_slug, field=TYPICAL):
+        return self.field(field)[:, question_index[question_slug]]
+
+    def respondent(self, i):
+        # questions x fields for respondent i, NaN for fields not computed
+        values = np.full((len(questions), len(fields)), np.nan)
+        values[:, :IMMATURE + 1] = self.answers[i]
+        for field, scored in self.scored.items():
+            values[:, field] = scored[i]
+        return values
+
+# Columns stored as floats so they can be NaN, but whose answers are whole
+# numbers: records show them as ints, as the export always has.
+integer_columns = {"is_parent"}
+
+class Record(Mapping):
+    __slots__ = ("responses", "i")
+
+    def __init__(self, responses, i):
+        self.responses = responses
+        self.i = i
+
+    def __getitem__(self, key):
+        if key == "questions":
+            return RecordQuestions(self.responses.respondent(self.i))
+        val = self.responses.columns[key][self.i]
+        if key in categorical:
+            return categorical[key].label(val)
+        if key in integer_columns and not np.isnan(val):
+            return int(val)
+        return val
 
-        line = line[:-1]
-        row = line.split("\t")
-        if not cols:
-            cols = row
+    def __iter__(self):
+        yield from self.responses.columns
+        yield "questions"
+
+    def __len__(self):
+        return len(self.responses.columns) + 1
+
+class RecordQuestions(Mapping):
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, question_slug):
+        return self.values[question_index[question_slug]]
+
+    def __iter__(self):
+        return iter(questions)
+
+    def __len__(self):
+        return len(questions)
+
+def per_responses(f):
+    # Like functools.lru_cache for f(records, ...), but keeps the results in
+    # records.cache, so they go away with records instead of piling up in a
+    # module-level cache.  Only for what the parsed columns determine, since
+    # those never change.
+    @functools.wraps(f)
+    def cached(records, *args, **kwargs):
+        key = (f.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in records.cache:
+            records.cache[key] = f(records, *args, **kwargs)
+        return records.cache[key]
+    return cached
+
+def answered(ages):
+    return ages[~np.isnan(ages)]
+
+def split_line(line):
+    return line.decode("utf-8").rstrip("\r\n").split("\t")
+
+# How many bytes of the file to parse at a time.  Memory for parsing grows
+# with this rather than with the size of the file; what we keep per
+# respondent is a few hundred bytes of arrays.
+default_chunk_size = 16 << 20
+
+def stream_responses(fname, start=None, first_line_number=2,
+                     chunk_size=default_chunk_size, workers=1, stop=None):
+    # Reads the rows of fname from byte offset `start` (default: just past
+    # the header) to `stop` (default: the end of the file, otherwise a line
+    # boundary) a chunk at a time, in `workers` processes if more than one,
+    # folding each chunk into the Aggregates in file order and keeping only
+    # its cleaned arrays.  Returns the Responses, the Aggregates and the
+    # offset we stopped at, so a later call can pick up any rows appended
+    # since.
+    if workers > 1:
+        # Enough chunks to keep every worker busy.
+        chunk_size = min(chunk_size, max(
+            ((stop or os.path.getsize(fname)) - (start or 0)) //
+            (4 * workers), 1 << 16))
+    ranges, end, rows = chunk_ranges(
+        fname, start, first_line_number, chunk_size, stop)
+    jobs = [[fname] * len(ranges)] + [list(column) for column in zip(*ranges)]
+    if workers <= 1 or len(ranges) <= 1:
+        records, aggregates = merge_parts(map(parse_range, *jobs), rows)
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(workers, len(ranges)),
+                initializer=start_worker,
+                initargs=worker_options()) as pool:
+            records, aggregates = merge_parts(
+                pool.map(parse_range, *jobs), rows)
+    return records, aggregates, end
+
+def merge_parts(parts, rows):
+    # Combines parse_range results, in file order, into the Responses and
+    # Aggregates for all of them.  Every row is a line of the file, so we know
+    # how many there are before parsing any: each part is copied into
+    # place as it arrives and then dropped, instead of holding them all to
+    # concatenate at the end.
+    aggregates = Aggregates()
+    answers, columns = Responses.empty(rows)
+    row = 0
+    unknown = defaultdict(dict)
+    for (part_answers, part_columns, part_aggregates, part_unknown,
+         cache_counts, spans) in parts:
+        if profile is not None:
+            profile.extend(spans)
+        n = len(part_answers)
+        answers[row:row + n] = part_answers
+        for name in parsed_columns:
+            columns[name][row:row + n] = part_columns[name]
+        row += n
+        aggregates.merge(part_aggregates)
+        for name, answer_lines in part_unknown.items():
+            for s, line_numbers in answer_lines.items():
+                unknown[name].setdefault(s, []).extend(line_numbers)
+        answer_cache_counts.update(cache_counts)
+
+    if unknown:
+        raise UnknownAnswers(unknown)
+
+    return Responses.from_answers(answers, columns), aggregates
+
+# What an unknown answer can be in, in the order we report them: "columns"
+# for rows too short to have every column, then the demographics, then each
+# question's typical age and age range.
+unknown_columns = ["columns"] + parsed_columns + [
+    "%s:%s" % (kind, question_slug)
+    for question_slug in questions for kind in ["typical", "range"]]
+
+class UnknownAnswers(Exception):
+    # Every answer in a file that we couldn't clean, as column -> answer ->
+    # line numbers, so a new export needs one run to find them all.
+
+    def __init__(self, unknown, max_lines=10):
+        self.unknown = unknown
+        super().__init__(self.report(max_lines))
+
+    def report(self, max_lines=None):
+        # Grouped by column, each distinct answer from most to least common,
+        # with the first max_lines of its line numbers (default: all).
+        lines = [line_numbers for answers in self.unknown.values()
+                 for line_numbers in answers.values()]
+        out = ["Unknown answers: %s cells, %s distinct" % (
+            sum(map(len, lines)), len(lines))]
+        for name in sorted(self.unknown, key=unknown_columns.index):
+            for s, line_numbers in sorted(self.unknown[name].items(),
+                                          key=lambda x: -len(x[1])):
+                shown = line_numbers[:max_lines]
+                plural = "s" if len(line_numbers) > 1 else ""
+                out.append("  %s: %r (%s row%s: line%s %s%s)" % (
+                    name, s, len(line_numbers), plural, plural,
+                    ", ".join(map(str, shown)),
+                    ", ..." if len(shown) < len(line_numbers) else ""))
+        return "\n".join(out)
+
+def chunk_ranges(fname, start=None, first_line_number=2,
+                 chunk_size=default_chunk_size, stop=None):
+    # Splits the rows from byte offset `start` (default: just past the
+    # header) to `stop` (default: the end of the file, otherwise a line
+    # boundary) into pieces of about chunk_size bytes that end on line
+    # boundaries.  Returns [(start, end, first line number)], at least one
+    # even if there are no rows, the offset of the end of the last, and how
+    # many lines they hold.
+    with open(fname, "rb") as inf:
+        header = inf.readline()
+        if start is None:
+            start = len(header)
+        if stop is None:
+            stop = os.path.getsize(fname)
+        inf.seek(start)
+        ranges = []
+        line_number = first_line_number
+        while True:
+            block = inf.read(max(min(chunk_size, stop - start), 0))
+            if block and block[-1:] != b"\n" and start + len(block) < stop:
+                block += inf.readline()
+            if not block and ranges:
+                break
+            ranges.append((start, start + len(block), line_number))
+            start += len(block)
+            line_number += block.count(b"\n")
+            if block[-1:] not in [b"", b"\n"]:
+                # The last line, without its newline.
+                line_number += 1
+            if not block:
+                break
+    return ranges, start, line_number - first_line_number
+
+def parse_range(fname, start, end, first_line_number):
+    # Cleans the rows between byte offsets start and end, which must fall
+    # on line boundaries.  Run in worker processes, so it returns compact
+    # per-chunk results for stream_responses to merge in order: the
+    # answers (respondents x questions x typical, mature, immature), the
+    # parsed columns, the Aggregates, any unknown answers, how the answer
+    # cache did, and any profiling spans.
+    before = answer_cache_info()
+    unknown = defaultdict(dict)
+    with span("parse chunk") as event:
+        with open(fname, "rb") as inf:
+            schema = Schema(split_line(inf.readline()))
+            inf.seek(start)
+            lines = inf.read(end - start).split(b"\n")
+        if lines[-1] == b"":
+            lines.pop()
+        event["rows"] = len(lines)
+        answers, columns = parse_rows(
+            schema, lines, first_line_number, unknown)
+    with span("aggregate chunk", len(lines)):
+        aggregates = Aggregates.from_responses(
+            Responses.from_answers(answers, columns))
+    return (answers, columns, aggregates, unknown,
+            answer_cache_info() - before, worker_spans())
+
+def parse_rows(schema, lines, first_line_number, unknown):
+    # Cleans raw lines into answers and parsed columns, noting any answers
+    # we can't clean in unknown (column -> answer -> line numbers, see
+    # unknown_columns) and leaving them NaN or MISSING.  Rows without every
+    # column are noted and skipped.
+
+    # typical, early, late for every question, flattened row by row
+    answer_values = []
+    columns = {name: [] for name in parsed_columns}
+
+    for line_number, line in enumerate(lines, first_line_number):
+        row = split_line(line)
+        if len(row) < schema.width:
+            unknown["columns"].setdefault(
+                "%s columns, expected at least %s" % (len(row), schema.width),
+                []).append(line_number)
             continue
-
-        def v(s):
-            return row[cols.index(s)]
-        def v2(s):
-            return row[cols.index(s, cols.index(
-                "Anything you'd like to clarify about your answers above?"))]
-
-        record["age"] = clean_age(v("What's your age?"))
-        record["oldest"] = clean_age(v(
-            "How old is your oldest child, if you have one?"))
-
-        record["area"] = clean_area(v("How would you describe your area?"))
-        record["childhood_area"] = \
-            clean_area(v(
-                "How would you describe the area where you grew up? (If "
-                "multiple, where you spent the majority of your time from 5-13)"))
-
-        record["n_children"] = clean_n_children(v(
-            "How many children do you have, if any?"))
-        
-        if record["n_children"] is None:
-            record["is_parent"] = float("nan")
-        elif record["n_children"] == "0":
-            record["is_parent"] = 2
-        elif record["n_children"] in ["1", "2", "3", "4", "5+"]:
-            record["is_parent"] = 1
+        (age, oldest, area, childhood_area, n_children, gender,
+         *answers) = schema.fields(row, line_number)
+
+        for name, s in [("area", area),
+                        ("childhood_area", childhood_area),
+                        ("n_children", n_children),
+                        ("gender", gender)]:
+            columns[name].append(categorical[name].encode(
+                s, unknown[name], line_number))
+
+        try:
+            cleaned = [clean_age(age), clean_age(oldest)]
+            for typical, age_range in zip(
+                    answers[:len(questions)], answers[len(questions):]):
+                cleaned.append(clean_age(typical))
+                cleaned.extend(clean_age_range(age_range))
+        except ValueError:
+            # Rare, so only now do we go cell by cell to find every answer
+            # in the row we can't clean.
+            cleaned = clean_row_cells(age, oldest, answers, line_number,
+                                      unknown)
+        columns["age"].append(cleaned[0])
+        columns["oldest"].append(cleaned[1])
+        answer_values.extend(cleaned[2:])
+
+    n = len(columns["age"])
+    answers = np.array(answer_values, dtype=float).reshape(
+        n, len(questions), IMMATURE + 1)
+    for name in ["age", "oldest"]:
+        columns[name] = np.array(columns[name], dtype=float)
+    for name in categorical:
+        columns[name] = np.array(columns[name], dtype=np.int8)
+    return answers, columns
+
+def clean_row_cells(age, oldest, answers, line_number, unknown):
+    # parse_rows' cleaning for one row, one answer at a time: anything we
+    # can't clean is noted in unknown and left NaN.
+    cells = [("age", age, clean_age), ("oldest", oldest, clean_age)]
+    for question_slug, typical, age_range in zip(
+            questions, answers[:len(questions)], answers[len(questions):]):
+        cells.append(("typical:" + question_slug, typical, clean_age))
+        cells.append(("range:" + question_slug, age_range, clean_age_range))
+
+    cleaned = []
+    for name, s, clean in cells:
+        try:
+            value = clean(s)
+        except ValueError:
+            unknown[name].setdefault(s, []).append(line_number)
+            value = (float('nan'),) * 2 if clean is clean_age_range else \
+                float('nan')
+        if clean is clean_age_range:
+            cleaned.extend(value)
         else:
-            assert False, record["n_children"]
-            
-        record["gender"] = clean_gender(v(
-            "What's your gender?"))
-
-        question_vals = {}
-        for question_slug, question_value in questions.items():
-            typical = clean_age(v(question_value))
-            early, late = clean_age_range(v2(question_value))
-
-            question_vals[question_slug] = [typical, early, late]
-        record["questions"] = question_vals
-
-        records.append(record)
-
-for record in records:
-    for question_slug, (typical, early, late) in record["questions"].items():
-        if not np.isnan(typical):
-            typicals[question_slug][typical] += 1
-        if not np.isnan(early):
-            earlies[question_slug][early] += 1
-        if not np.isnan(late):
-            lates[question_slug][late] += 1
-
-for question_slug in questions:
-    typical_vals = [record["questions"][question_slug][0]
-                    for record in records]
-    typical_zscores = scipy.stats.zscore(typical_vals, nan_policy='omit')
-    typical_mean = np.mean([x for x in typical_vals if not np.isnan(x)])
-    typical_distance_from_mean_years = [
-        val - typical_mean
-        for val in typical_vals
-    ]
-    for zscore, distance_years, record in zip(
-            typical_zscores, typical_distance_from_mean_years, records):
-        record["questions"][question_slug].append(zscore)
-        record["questions"][question_slug].append(distance_years)
-
-
-for record in records:
-    zscores = [record["questions"][question_slug][3]
-               for question_slug in questions]
-    zscores = [x for x in zscores if not np.isnan(x)]
-    record['mean_zscore'] = np.mean(zscores) if zscores else float('nan')
-    
-    distances = [record["questions"][question_slug][4]
-                 for question_slug in questions]
-    distances = [x for x in distances if not np.isnan(x)]
-    record['mean_distance_years'] = \
-        np.mean(distances) if distances else float('nan')
-    record["highlight"] = None
-    if (record["age"] == 37 and
-        record["gender"] == "Male" and
-        record["area"][1] == "moderately urban" and
-        record["childhood_area"][1] == "slightly urban"):
-        record["highlight"] = 'b'
-    if record["age"] == 7:
-        record["highlight"] = 'r'
-    if record["age"] == 9 and  record["area"][1] == "moderately urban":
-        record["highlight"] = 'r'
-              
-    
-# Which question is most representative?
-#
-# For each person - question pair we have a zscore, and we have the person's
-# mean zscore.  Representativeness for a person+question could be:
-#
-#    abs(zscore(person, question) - zscore(person, *))
-#
-# And then we could average this over questions?
-question_deltas = [] # delta, question
-for question_slug in questions:
-    deltas = []
-    for record in records:
-        mean_zscore = record['mean_zscore']
-        if np.isnan(mean_zscore):
-            continue
-
-        question_zscore = record["questions"][question_slug][-1]
-        if np.isnan(question_zscore):
-            continue
-        deltas.append(abs(question_zscore - mean_zscore))
+            cleaned.append(value)
+    return cleaned
+
+Scores = namedtuple("Scores", [
+    "zscore",               # respondents x questions
+    "years_above_mean",     # respondents x questions
+    "mean_zscore",          # per respondent
+    "mean_distance_years",  # per respondent
+])
 
-    question_deltas.append((
-        np.mean(deltas), question_slug))
+def compute_scores(values, subset=None, moments=None):
+    # Scores each typical-age answer against everyone in `subset` (an index
+    # array or boolean mask; default all respondents) who answered that
+    # question, ignoring NaNs, and averages each respondent's scores over the
+    # questions they answered.  Returns Scores for the respondents in
+    # `subset`, in order.
+    #
+    # If you already have Aggregates.moments() for those respondents, pass
+    # them to skip recomputing each question's mean and standard deviation.
+    typical = values[:, :, TYPICAL]
+    if subset is not None:
+        typical = typical[subset]
+
+    with warnings.catch_warnings():
+        # Questions nobody answered, and respondents who answered no
+        # questions, get NaN.
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if moments is None:
+            mean = np.nanmean(typical, axis=0)
+            std = np.nanstd(typical, axis=0)
+        else:
+            count, total, sum_sq = moments
+            mean = total / count
+            std = np.sqrt(sum_sq / count)
+        years_above_mean = typical - mean
+        zscore = years_above_mean / std
+        return Scores(zscore, years_above_mean,
+                      np.nanmean(zscore, axis=1),
+                      np.nanmean(years_above_mean, axis=1))
+
+Percentiles = namedtuple("Percentiles", [
+    "rank",     # respondents x questions
+    "mean",     # per respondent
+    "spread",   # per respondent; lower is more consistent
+])
 
-for delta, question_slug in sorted(question_deltas):
-    print(delta, question_slug)
+def percentile_ranks(values):
+    # Where each respondent's typical age for each question falls among
+    # everyone who answered it: the fraction of answers below theirs plus
+    # half the fraction equal to it, so ties share their average rank.
+    # Each question is ranked with a single sort.  Also returns each
+    # respondent's mean rank and the standard deviation of their ranks, which
+    # is small for someone who is about as cautious on every question; both
+    # need two answered questions, and are NaN otherwise.
+    typical = values[:, :, TYPICAL]
+    rank = np.full(typical.shape, np.nan)
+    for q in range(typical.shape[1]):
+        present = ~np.isnan(typical[:, q])
+        ages, inverse, counts = np.unique(
+            typical[present, q], return_inverse=True, return_counts=True)
+        below = np.cumsum(counts) - counts
+        rank[present, q] = ((below + counts / 2) / len(inverse))[inverse]
+
+    two = np.count_nonzero(~np.isnan(rank), axis=1) >= 2
+    mean = np.full(len(rank), np.nan)
+    spread = np.full(len(rank), np.nan)
+    mean[two] = np.nanmean(rank[two], axis=1)
+    spread[two] = np.nanstd(rank[two], axis=1)
+    return Percentiles(rank, mean, spread)
+
+def add_scores(records, aggregates):
+    # Scores records against aggregates, keeps every answer's and
+    # respondent's Scores in records, and returns them.
+    scores = compute_scores(records.answers, moments=aggregates.moments())
+    records.scored[ZSCORE] = scores.zscore
+    records.scored[YEARS_ABOVE_MEAN] = scores.years_above_mean
+    records.columns["mean_zscore"] = scores.mean_zscore
+    records.columns["mean_distance_years"] = scores.mean_distance_years
+    return scores
+
+def kept_scores(records):
+    # The Scores add_scores kept in records.
+    return Scores(records.scored[ZSCORE], records.scored[YEARS_ABOVE_MEAN],
+                  records.columns["mean_zscore"],
+                  records.columns["mean_distance_years"])
+
+def add_percentiles(records):
+    # Likewise for Percentiles.
+    percentiles = percentile_ranks(records.answers)
+    records.scored[PERCENTILE] = percentiles.rank
+    records.columns["mean_percentile"] = percentiles.mean
+    records.columns["percentile_spread"] = percentiles.spread
+    return percentiles
+
+def kept_percentiles(records):
+    return Percentiles(records.scored[PERCENTILE],
+                       records.columns["mean_percentile"],
+                       records.columns["percentile_spread"])
+
+def nan_corrcoef(x):
+    # Pearson correlation between the columns of x, each pair computed over
+    # the rows where both are present.
+    present = ~np.isnan(x)
+    p = present.astype(float)
+    x = np.where(present, x, 0)
+    n = p.T @ p
+    # sx[i, j] is the sum of column i over the rows where column j is present
+    sx = x.T @ p
+    sxx = (x * x).T @ p
+    cov = n * (x.T @ x) - sx * sx.T
+    var = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov / np.sqrt(var * var.T)
+
+def analyze_questions(scores):
+    # Which question is most representative?
+    #
+    # For each person - question pair we have a zscore, and we have the
+    # person's mean zscore.  Representativeness for a question is:
+    #
+    #    abs(zscore(person, question) - zscore(person, *))
+    #
+    # averaged over everyone who answered it; smaller is more representative.
+    #
+    # We also look at how the questions move together: their pairwise
+    # correlations, and the principal components of those correlations
+    # (largest first).  Since z-scores are standardized per question, this is
+    # PCA of the z-score matrix, using all the pairs each respondent answered
+    # instead of only people who answered everything.
+    zscore = scores.zscore
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        representativeness = np.nanmean(
+            np.abs(zscore - scores.mean_zscore[:, np.newaxis]), axis=0)
+
+    correlation = nan_corrcoef(zscore)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.nan_to_num(correlation))
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = eigenvalues[order]
+    components = eigenvectors[:, order].T
+    # An eigenvector's sign is arbitrary; point each one towards "older".
+    components *= np.where(components.sum(axis=1) < 0, -1, 1)[:, np.newaxis]
+
+    return {
+        "representativeness": representativeness,
+        "correlation": correlation,
+        "explained_variance":
+            np.clip(eigenvalues, 0, None) / np.clip(eigenvalues, 0, None).sum(),
+        "components": components,
+    }
+
+class Groups:
+    # Buckets respondents by a key in a single pass.
+    #
+    #   keys: the distinct keys, in order of first appearance
+    #   codes: per respondent, their key's position in `keys`, or -1
+    #   counts: per key, how many respondents have it
+    #   indices: per key, which respondents have it, in respondent order
+
+    @classmethod
+    def from_keys(cls, key_values):
+        # One key per respondent, None to leave them out.
+        positions = {}
+        codes = np.array([
+            -1 if key is None else positions.setdefault(key, len(positions))
+            for key in key_values], dtype=np.intp)
+        return cls(list(positions), codes)
+
+    @classmethod
+    def from_codes(cls, codes, labels):
+        # Integer codes per respondent, MISSING to leave them out, where code
+        # n means labels[n].  Codes sharing a label share a group.
+        positions = {}
+        table = np.array([positions.setdefault(label, len(positions))
+                          for label in labels] + [-1], dtype=np.intp)
+        codes = table[codes]  # MISSING picks the trailing -1
+        present = codes >= 0
+        seen, first = np.unique(codes[present], return_index=True)
+        seen = seen[np.argsort(first)]
+        renumber = np.full(len(positions) + 1, -1, dtype=np.intp)
+        renumber[seen] = np.arange(len(seen))
+        keys = list(positions)
+        return cls([keys[code] for code in seen], renumber[codes])
+
+    def __init__(self, keys, codes):
+        self.keys = keys
+        self.codes = codes
+        self.counts = np.bincount(self.codes[self.codes >= 0],
+                                  minlength=len(self.keys))
+        order = np.argsort(self.codes, kind="stable")
+        order = order[np.count_nonzero(self.codes < 0):]
+        self.indices = np.split(order, np.cumsum(self.counts)[:-1])
+
+    def counter(self):
+        return Counter(dict(zip(self.keys, self.counts.tolist())))
+
+    def values(self, vals):
+        # (key, non-NaN vals of its members) for each key that has any, from
+        # the largest key to the smallest.
+        result = []
+        for key, indices in sorted(zip(self.keys, self.indices),
+                                   key=lambda x: x[0], reverse=True):
+            group_vals = answered(vals[indices])
+            if len(group_vals):
+                result.append((key, group_vals))
+        return result
 
 
 def short_label(question_slug):
@@ -315,251 +1039,8 @@ def short_label(question_slug):
     elif question_slug in ["transit", "bike", "school"] or question_slug.startswith("street"):
         return "movement"
 
-print("Responses: %s" % len(records))
-
-print("Gender counts:")
-genders = Counter()
-for record in records:
-    if record["gender"]:
-        genders[record["gender"]] += 1
-for gender in ["Male", "Female", "Non-binary"]:
-    print("  %s %s (%.0f%%)" % (
-        gender, genders[gender], 100 * genders[gender] / sum(genders.values())))    
-
-print("Area counts:")
-areas = Counter()
-for record in records:
-    if record["area"]:
-        areas[record["area"]] += 1
-for area in areas:
-    print("  %s %s (%.0f%%)" % (
-        area, areas[area], 100 * areas[area] / sum(areas.values())))    
-
-print("Childhood Area counts:")
-childhood_areas = Counter()
-for record in records:
-    if record["childhood_area"]:
-        childhood_areas[record["childhood_area"]] += 1
-for childhood_area in childhood_areas:
-    print("  %s %s (%.0f%%)" % (
-        childhood_area, childhood_areas[childhood_area], 100 * childhood_areas[childhood_area] / sum(childhood_areas.values())))    
-
-print("N children counts:")
-n_childrens = Counter()
-for record in records:
-    if record["n_children"]:
-        n_childrens[record["n_children"]] += 1
-for n_children in n_childrens:
-    print("  %s %s (%.0f%%)" % (
-        n_children, n_childrens[n_children], 100 * n_childrens[n_children] / sum(n_childrens.values())))    
-
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mtick
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-
-all_ages = []
-ages = Counter()
-for record in records:
-    if np.isnan(record['age']): continue
-    ages[record['age']] += 1
-    all_ages.append(record['age'])
-for age, count in ages.items():
-    xs.append(age)
-    ys.append(count)
-ax.set_title("Age distribution of respondents")
-ax.set_xlabel("Age")
-ax.set_ylabel("Number of respondents")
-ax.set_ylim(ymin=0, ymax=18)
-ax.scatter(xs, ys)
-fig.savefig("parenting-survey-age-distibution-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-
-ages = Counter()
-for record in records:
-    if np.isnan(record['age']): continue
-    if np.isnan(record['mean_distance_years']): continue
-    xs.append(record['age'])
-    ys.append(record['mean_distance_years'])
-ax.set_title("Relation between age and higher-age responses")
-ax.set_xlabel("Respondent age")
-ax.set_ylabel("Mean years later than average")
-ax.scatter(xs, ys)
-fig.savefig("parenting-survey-age-vs-relative-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-
-ages = Counter()
-for record in records:
-    if np.isnan(record['oldest']): continue
-    if np.isnan(record['mean_distance_years']): continue
-    xs.append(record['oldest'])
-    ys.append(record['mean_distance_years'])
-ax.set_title("Relation between age of oldest child and higher-age responses")
-ax.set_xlabel("Respondent's oldest child")
-ax.set_ylabel("Mean years later than average")
-ax.scatter(xs, ys)
-fig.savefig("parenting-survey-oldest-vs-relative-big.png", dpi=180)
-plt.close()
-
-print("Median age: %s" % np.median(all_ages))
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-all_oldests = []
-oldests = Counter()
-for record in records:
-    if np.isnan(record['oldest']): continue
-    oldests[round(record['oldest'])] += 1
-    all_oldests.append(record['oldest'])
-for oldest, count in oldests.items():
-    xs.append(oldest)
-    ys.append(count)
-ax.set_title("Distribution of the oldest child of respondents")
-ax.set_xlabel("Oldest child, if a parent")
-ax.set_ylabel("Number of respondents")
-ax.set_ylim(ymin=0, ymax=24)
-ax.scatter(xs, ys)
-fig.savefig("parenting-survey-oldest-distibution-big.png", dpi=180)
-plt.close()
-
-print("Fraction oldest under 18: %.0f%%" % (
-    100 * sum(1 for x in all_oldests if x < 18) /
-    len(all_oldests)))
-
-print("Median oldest: %s" % np.median(all_oldests))
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-for record in records:
-    if np.isnan(record['mean_zscore']): continue
-    if np.isnan(record['age']): continue
-    xs.append(record['age'])
-    ys.append(record['mean_zscore'])
-ax.scatter(xs, ys)
-ax.set_title("Caution by age")
-ax.set_xlabel("Age")
-ax.set_ylabel("Caution z-score")
-fig.savefig("parenting-survey-caution-by-age-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-xs = []
-ys = []
-for record in records:
-    if np.isnan(record['mean_zscore']): continue
-    if np.isnan(record['oldest']): continue
-    xs.append(record['oldest'])
-    ys.append(record['mean_zscore'])
-ax.scatter(xs, ys)
-ax.set_title("Caution by age of oldest child (parents only)")
-ax.set_xlabel("Age of oldest child")
-ax.set_ylabel("Caution z-score")
-fig.savefig("parenting-survey-caution-by-age-of-oldest-big.png", dpi=180)
-plt.close()
-
-oldest_at_birth = []
-for record in records:
-    if np.isnan(record['age']): continue
-    if np.isnan(record['oldest']): continue
-    oldest_at_birth.append(record['age'] - record['oldest'])
-print("Mean age at first child: %s" % np.mean(oldest_at_birth))
-print("Median age at first child: %s" % np.median(oldest_at_birth))
-
-fig, ax = plt.subplots(constrained_layout=True)
-sorted_areas = []
-ys = []
-xs = []
-for n, area in sorted(areas):
-    ys.append(area)
-    sorted_areas.append(area)
-    xs.append(areas[n, area])
-y_pos = np.arange(len(ys))
-ax.barh(y_pos, xs, align='center')
-ax.set_yticks(y_pos)
-ax.set_yticklabels(ys)
-ax.invert_yaxis()  # labels read top-to-bottom
-ax.set_xlabel('Respondents')
-ax.set_title('Location distribution of respondents')
-fig.savefig("parenting-survey-current-location-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-ys = []
-xs = []
-for n, childhood_area in sorted(childhood_areas):
-    ys.append(childhood_area)
-    xs.append(childhood_areas[n, childhood_area])
-y_pos = np.arange(len(ys))
-ax.barh(y_pos, xs, align='center')
-ax.set_yticks(y_pos)
-ax.set_yticklabels(ys)
-ax.invert_yaxis()  # labels read top-to-bottom
-ax.set_xlabel('Respondents')
-ax.set_title('Childhood location distribution of respondents')
-fig.savefig("parenting-survey-childhood-location-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-area_scatter_counts = Counter()
-for record in records:
-    if record["area"] and record["childhood_area"]:
-        area_scatter_counts[record["area"][0],
-                            record["childhood_area"][0]] += 1
-
-ys = []
-xs = []
-sizes= []
-for (y, x), count in area_scatter_counts.items():
-    xs.append(x)
-    ys.append(y)
-    sizes.append(count*30)
-
-plt.xticks([n+1 for n in range(len(sorted_areas))], sorted_areas,
-           rotation=45, ha='right')
-plt.yticks([n+1 for n in range(len(sorted_areas))], sorted_areas)
-ax.set_xlabel('Childhood area')
-ax.set_ylabel('Current area')
-
-ax.set_title('Relation between current area and childhood area')
-
-ax.scatter(xs, ys, sizes=sizes)
-
-fig.savefig("parenting-survey-location-relation-big.png", dpi=180)
-plt.close()        
-
-
-fig, ax = plt.subplots(constrained_layout=True)
-ys = []
-xs = []
-for n_children in sorted(n_childrens):
-    ys.append(n_children)
-    xs.append(n_childrens[n_children])
-y_pos = np.arange(len(ys))
-ax.barh(y_pos, xs, align='center')
-ax.set_yticks(y_pos)
-ax.set_yticklabels(ys)
-ax.invert_yaxis()  # labels read top-to-bottom
-ax.set_xlabel('Respondents')
-ax.set_title('Number of children')
-fig.savefig("parenting-survey-number-of-children-big.png", dpi=180)
-plt.close()
-
-
-
-def tidy_label(variable, record):
-    val = record[variable]
+
+def tidy_label(variable, val):
     if variable == "is_parent":
         #print(val)
         return {
@@ -632,321 +1113,881 @@ def tidy_label(variable, record):
         return val
 
 
-fig, ax = plt.subplots(constrained_layout=True, figsize=(8,8))
-x = []
-labels = []
-for variable in [
-        "childhood_area", "area", "oldest", "n_children", "gender"]:
-    def include(record):
-        return record[variable] and not np.isnan(record['mean_zscore'])
-    for label in sorted(set(tidy_label(variable, record)
-                          for record in records
-                          if include(record)),
-                      reverse=True):
-        vals = [record['mean_zscore']
-                for record in records
-                if include(record) and tidy_label(variable, record) == label]
-        if type(label) == type(()):
-            _, label = label
-
-        labels.append("%s (n=%s)" % (label, len(vals)))
-        x.append(vals)
-
-    if variable != "gender":
-        labels.append("")
-        x.append([])
-box = ax.boxplot(x, labels=labels, vert=False, showfliers=False, showmeans=True)
-for _, line_list in box.items():
-    for line in line_list:
-        if line.get_color() != "black":
-            line.set_linewidth(line.get_linewidth() * 2)
-
-
-for n, points in enumerate(x):
-    xs_prejitter = points
-    ys_prejitter = [n+1 for _ in points]
-
-    xs = xs_prejitter + np.random.normal(0, 0.05, size=(len(points)))
-    ys = ys_prejitter + np.random.normal(0, 0.05, size=(len(points)))
-    ax.plot(xs, ys, 'b.', alpha=0.2)
-
-ax.set_title("Factors predicting higher-age responses")
-ax.set_xlabel("Mean z-score: larger values indicate higher-age responses")
-fig.savefig("parenting-survey-factors-big.png", dpi=180)
-plt.close()
-
-
-for figlabel, factors, figsize in [
-        ("areas", ("childhood_area", "area"), (8,3)),
-        ("kids", ("oldest", "n_children", "is_parent"), (8,5)),
-        ("gender", ("gender", ), (8,2)),
-        ("age", ("age", ), (8,3)),
-]:
+@per_responses
+def factor_groups(records, variable, skip_nan=False):
+    # Respondents grouped by tidy_label, computed once per variable and
+    # shared by every factor figure.
+    with span("group by %s" % variable, len(records)):
+        if variable in categorical:
+            return Groups.from_codes(records.columns[variable], [
+                tidy_label(variable, label)
+                for label in categorical[variable].labels])
+
+        def key(val):
+            if not val:
+                return None
+            if skip_nan and isinstance(val, float) and np.isnan(val):
+                return None
+            return tidy_label(variable, val)
+        return Groups.from_keys(
+            key(val) for val in records.columns[variable])
+
+# Bootstrap resamples are drawn about this many bytes at a time.
+bootstrap_batch_bytes = 32 << 20
+
+def bootstrap_means(groups, values, resamples=10000, level=0.95, seed=0,
+                    workers=1):
+    # Percentile bootstrap confidence intervals for the mean of each column
+    # of `values` (respondents x columns, NaN where unanswered) within each
+    # of `groups` (arrays of respondent indices, which may overlap).  Each
+    # group's respondents are resampled with replacement, all groups and
+    # columns at once.  Returns (mean, low, high), each groups x columns.
+    #
+    # Batch n of resamples always comes from default_rng([seed, n]), so the
+    # intervals don't depend on how many workers drew them.
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    sizes = np.array([len(group) for group in groups], dtype=np.intp)
+    mean = np.full((len(groups), values.shape[1]), np.nan)
+    low = mean.copy()
+    high = mean.copy()
+    present = sizes > 0
+    if not present.any() or resamples < 1:
+        return mean, low, high
+
+    # Each group's members get consecutive slots; a resample is a count
+    # per slot.  Summing value * count and answered * count per group
+    # then gives every column's mean in one matrix product per group.
+    members = np.concatenate([group for group in groups if len(group)])
+    sizes = sizes[present]
+    answered_values = ~np.isnan(values[members])
+    slot_values = np.hstack([
+        np.where(answered_values, values[members], 0),
+        answered_values]).astype(float)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean[present] = group_means(
+            np.ones((1, len(members))), slot_values, starts, sizes)[0]
+
+    batch = max(1, bootstrap_batch_bytes // (24 * len(members)))
+    batches = [(n, min(batch, resamples - start))
+               for n, start in enumerate(range(0, resamples, batch))]
+    job = (slot_values, starts, sizes, seed)
+    if workers <= 1 or len(batches) <= 1:
+        means = bootstrap_batches(*job, batches)
+    else:
+        import concurrent.futures
+        workers = min(workers, len(batches))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers) as pool:
+            parts = list(pool.map(
+                bootstrap_batches, *zip(*[
+                    job + (batches[w::workers],) for w in range(workers)])))
+        # Worker w drew batches w, w + workers, ...
+        means = [None] * len(batches)
+        for w, part in enumerate(parts):
+            means[w::workers] = part
+    means = np.concatenate(means)
+
+    # A resample of a small group can have nobody who answered, and a
+    # group where nobody answered a question has no interval at all.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        low[present], high[present] = np.nanpercentile(
+            means, [50 * (1 - level), 50 * (1 + level)], axis=0)
+    return mean, low, high
+
+def bootstrap_batches(slot_values, starts, sizes, seed, batches):
+    # Group means for each resample in `batches` [(batch number, how many
+    # resamples)].  Returns a resamples x groups x columns array per batch.
+    n_slots = len(slot_values)
+    offsets = np.repeat(starts, sizes)
+    highs = np.repeat(sizes, sizes).astype(float)
+    results = []
+    for n, count in batches:
+        rng = np.random.default_rng([seed, n])
+        slots = offsets + (rng.random((count, n_slots)) * highs).astype(
+            np.intp)
+        slots += np.arange(count)[:, np.newaxis] * n_slots
+        counts = np.bincount(
+            slots.ravel(), minlength=count * n_slots).reshape(count, n_slots)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            results.append(group_means(counts, slot_values, starts, sizes))
+    return results
+
+def group_means(counts, slot_values, starts, sizes):
+    # counts: resamples x slots
+    # slot_values: slots x (column values with NaN as 0, then answered)
+    columns = slot_values.shape[1] // 2
+    sums = np.stack([
+        counts[:, start:start + size] @ slot_values[start:start + size]
+        for start, size in zip(starts, sizes)], axis=1)
+    return sums[:, :, :columns] / sums[:, :, columns:]
+
+# The factor variables we report confidence intervals for, and what for.
+interval_variables = [
+    "childhood_area", "area", "oldest", "n_children", "gender", "is_parent",
+    "age"]
+interval_metrics = ["mean_zscore", "mean_distance_years"]
+
+def compared_values(records):
+    # The columns group_intervals and factor_tests compare between groups:
+    # each respondent score, then each question's typical age.  Returns
+    # (names, respondents x columns).
+    names = interval_metrics + [
+        "typical:" + question_slug for question_slug in questions]
+    values = np.column_stack(
+        [records.columns[name] for name in interval_metrics] +
+        [records.question(question_slug) for question_slug in questions])
+    return names, values
+
+def group_name(key):
+    # tidy_label keys are (sort key, name) where they need ordering.
+    return key[1] if type(key) == type(()) else key
+
+def number(x):
+    return None if np.isnan(x) else float(x)
+
+def group_intervals(records, bootstrap):
+    # For every tidy_label group of every factor variable: the group's mean
+    # of each respondent score and each question's typical age, with a
+    # confidence interval from bootstrap(groups, values).
+    names, values = compared_values(records)
+
+    rows = []
+    for variable in interval_variables:
+        groups = factor_groups(records, variable, skip_nan=True)
+        for key, indices in sorted(zip(groups.keys, groups.indices),
+                                   key=lambda x: x[0], reverse=True):
+            rows.append((variable, key, indices))
+    mean, low, high = bootstrap(
+        [indices for variable, key, indices in rows], values)
+
+    return [{
+        "variable": variable,
+        "group": group_name(key),
+        "n": len(indices),
+        "intervals": {
+            name: {
+                "answered": int(np.count_nonzero(
+                    ~np.isnan(values[indices, c]))),
+                "mean": number(mean[r, c]),
+                "low": number(low[r, c]),
+                "high": number(high[r, c]),
+            } for c, name in enumerate(names)},
+    } for r, (variable, key, indices) in enumerate(rows)]
+
+# Permutations are drawn about this many bytes at a time.
+permutation_batch_bytes = 32 << 20
+
+def permutation_tests(codes, values, permutations=10000, seed=0, workers=1):
+    # Permutation tests of whether each column of `values` (respondents x
+    # columns, NaN where unanswered) differs between the groups of each
+    # factor in `codes` (per factor, each respondent's group number, or -1 to
+    # leave them out).  The statistic is the between-group sum of squares of
+    # the answered values, which for two groups is a two-sided test of the
+    # difference in means.  Each permutation shuffles a factor's labels
+    # among its respondents, and a batch of permutations is scored at once
+    # by group_sums.  Returns (statistic, p), each factors x columns.
+    #
+    # Batch n of permutations always comes from default_rng([seed, n]), so
+    # p-values don't depend on how many workers drew them.
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    answered_values = ~np.isnan(values)
+    slot_values = np.hstack([
+        np.where(answered_values, values, 0), answered_values]).astype(float)
+
+    factors = []
+    statistic = np.full((len(codes), values.shape[1]), np.nan)
+    for f, factor_codes in enumerate(codes):
+        factor_codes = np.asarray(factor_codes)
+        present = factor_codes >= 0
+        labels = factor_codes[present]
+        groups = labels.max() + 1 if len(labels) else 0
+        factor_values = slot_values[present]
+        observed, offset = between_groups(
+            group_sums(labels[np.newaxis], groups, factor_values))
+        statistic[f] = observed[0] - offset
+        factors.append((labels, groups, factor_values, observed[0]))
+    if permutations < 1 or not factors:
+        return statistic, np.full(statistic.shape, np.nan)
+
+    largest = max([group_sums_bytes(groups) * len(labels)
+                   for labels, groups, factor_values, observed in factors] +
+                  [1])
+    batch = max(1, permutation_batch_bytes // largest)
+    batches = [(n, min(batch, permutations - start))
+               for n, start in enumerate(range(0, permutations, batch))]
+    if workers <= 1 or len(batches) <= 1:
+        exceed = permutation_batches(factors, seed, batches)
+    else:
+        import concurrent.futures
+        workers = min(workers, len(batches))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers) as pool:
+            exceed = sum(pool.map(
+                permutation_batches, [factors] * workers, [seed] * workers,
+                [batches[w::workers] for w in range(workers)]))
+
+    with np.errstate(invalid="ignore"):
+        p = np.where(np.isnan(statistic), np.nan,
+                     (1 + exceed) / (1 + permutations))
+    return statistic, p
+
+def permutation_batches(factors, seed, batches):
+    # How many permutations in `batches` [(batch number, how many
+    # permutations)] score at least the observed statistic, factors x
+    # columns.
+    exceed = np.zeros((len(factors), factors[0][2].shape[1] // 2),
+                      dtype=np.int64)
+    for n, count in batches:
+        rng = np.random.default_rng([seed, n])
+        for f, (labels, groups, factor_values, observed) in enumerate(
+                factors):
+            shuffled = rng.permuted(
+                np.broadcast_to(labels, (count, len(labels))), axis=1)
+            permuted, offset = between_groups(
+                group_sums(shuffled, groups, factor_values))
+            # Permutations that regroup respondents the same way as the
+            # observed labels can differ from it by rounding alone.
+            exceed[f] += np.count_nonzero(
+                permuted >= observed - 1e-9 * np.abs(observed), axis=0)
+    return exceed
+
+# Up to this many groups, group_sums multiplies by a one-hot matrix; past
+# it, the matrix grows big enough that bincounts are faster.
+one_hot_max_groups = 4
+
+def group_sums_bytes(groups):
+    # Memory group_sums takes per permutation and respondent: a one-hot
+    # entry per group as a bool and a float, or a label and a weight.
+    return 9 * groups if groups <= one_hot_max_groups else 16
+
+def group_sums(labels, groups, slot_values):
+    # labels: permutations x respondents, each a group number
+    # slot_values: respondents x (column values with NaN as 0, then answered)
+    # Returns permutations x groups x (column sums, then answered counts).
+    if groups <= one_hot_max_groups:
+        one_hot = labels[:, np.newaxis, :] == np.arange(groups)[:, np.newaxis]
+        return (one_hot.reshape(len(labels) * groups, labels.shape[1]).astype(
+            float) @ slot_values).reshape(len(labels), groups, -1)
+
+    # Numbering group g of permutation k as k * groups + g lets a single
+    # bincount sum a column for every group of every permutation at once.
+    # Shuffling labels keeps each group's size, so a group's answered count
+    # is its size less its unanswered respondents, who are few.
+    slots = np.ascontiguousarray(
+        np.arange(len(labels))[:, np.newaxis] * groups + labels)
+    columns = slot_values.shape[1] // 2
+    sums = np.empty((len(labels) * groups, 2 * columns))
+    sizes = np.tile(np.bincount(labels[0], minlength=groups), len(labels))
+    weights = np.empty(labels.shape)
+    for column, column_values in enumerate(
+            np.ascontiguousarray(slot_values[:, :columns].T)):
+        weights[:] = column_values
+        sums[:, column] = np.bincount(
+            slots.ravel(), weights=weights.ravel(), minlength=len(sums))
+        unanswered = slot_values[:, columns + column] == 0
+        sums[:, columns + column] = sizes - np.bincount(
+            slots[:, unanswered].ravel(), minlength=len(sums))
+    return sums.reshape(len(labels), groups, -1)
+
+def between_groups(sums):
+    # sums: permutations x groups x (column sums, then answered counts)
+    # Returns (sum over groups of sum ** 2 / count, sum ** 2 / count over all
+    # groups), each permutations x columns; their difference is the
+    # between-group sum of squares.  The second is the same for every
+    # permutation, so comparing permutations by the first alone avoids
+    # rounding from the subtraction.
+    columns = sums.shape[2] // 2
+    total, count = sums[:, :, :columns], sums[:, :, columns:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return ((np.where(count > 0, total ** 2 / count, 0)).sum(axis=1),
+                (total.sum(axis=1) ** 2 / count.sum(axis=1))[0])
+
+def holm(p):
+    # Holm-Bonferroni adjusted p-values, which bound the chance of any false
+    # positive among all of p.  NaNs are left out and stay NaN.
+    p = np.asarray(p, dtype=float)
+    adjusted = np.full(p.shape, np.nan)
+    tested = ~np.isnan(p)
+    order = np.argsort(p[tested])
+    m = len(order)
+    steps = np.maximum.accumulate((m - np.arange(m)) * p[tested][order])
+    result = np.empty(m)
+    result[order] = np.minimum(steps, 1)
+    adjusted[tested] = result
+    return adjusted
+
+def benjamini_hochberg(p):
+    # Benjamini-Hochberg adjusted p-values, which bound the expected
+    # fraction of false positives among the tests below a threshold.  NaNs
+    # are left out and stay NaN.
+    p = np.asarray(p, dtype=float)
+    adjusted = np.full(p.shape, np.nan)
+    tested = ~np.isnan(p)
+    order = np.argsort(p[tested])
+    m = len(order)
+    steps = p[tested][order] * m / np.arange(1, m + 1)
+    steps = np.minimum.accumulate(steps[::-1])[::-1]
+    result = np.empty(m)
+    result[order] = np.minimum(steps, 1)
+    adjusted[tested] = result
+    return adjusted
+
+def factor_tests(records, permutation_test):
+    # For every factor variable, whether each respondent score and each
+    # question's typical age differs between its tidy_label groups, by
+    # permutation_test(codes, values).  p-values are adjusted over every
+    # factor and question together.
+    names, values = compared_values(records)
+    groups = [factor_groups(records, variable, skip_nan=True)
+              for variable in interval_variables]
+    statistic, p = permutation_test([g.codes for g in groups], values)
+    p_holm = holm(p.ravel()).reshape(p.shape)
+    p_fdr = benjamini_hochberg(p.ravel()).reshape(p.shape)
+
+    return [{
+        "variable": variable,
+        "groups": [group_name(key) for key in g.keys],
+        "n": int(g.counts.sum()),
+        "tests": {
+            name: {
+                "between_groups_ss": number(statistic[f, c]),
+                "p": number(p[f, c]),
+                "p_holm": number(p_holm[f, c]),
+                "p_fdr": number(p_fdr[f, c]),
+            } for c, name in enumerate(names)},
+    } for f, (variable, g) in enumerate(zip(interval_variables, groups))]
+
+class ECDF:
+    # Empirical CDF of the answers to one question, built from a histogram
+    # (age -> count) and kept as the distinct ages in order plus how many
+    # answered at most each, so queries are a binary search.
+
+    def __init__(self, histogram):
+        self.ages = np.array(sorted(histogram), dtype=float)
+        self.at_most = np.concatenate([[0], np.cumsum(
+            [histogram[age] for age in sorted(histogram)], dtype=np.int64)])
+
+    def __len__(self):
+        return int(self.at_most[-1])
+
+    def count_at_most(self, age):
+        return self.at_most[np.searchsorted(self.ages, age, side="right")]
+
+    def fraction_at_most(self, age):
+        # What fraction of respondents think a child of this age is ready?
+        return self.count_at_most(age) / len(self)
+
+    def age_at_fraction(self, fraction):
+        # The youngest age at which at least this fraction of respondents
+        # think a child is ready.
+        needed = max(int(np.ceil(fraction * len(self))), 1)
+        i = np.searchsorted(self.at_most[1:], needed, side="left")
+        return self.ages[min(i, len(self.ages) - 1)]
+
+# How we label each kind of estimate in CDFs, in plotting order.
+ecdf_kinds = [("typical", TYPICAL), ("immature", IMMATURE), ("mature", MATURE)]
+
+def ecdf_index(aggregates):
+    # question -> kind -> ECDF
+    return {
+        question_slug: {
+            label: ECDF(aggregates.histograms[label][question_slug])
+            for label, field in ecdf_kinds}
+        for question_slug in questions}
+
+class Aggregates:
+    # Everything we summarize about the survey as a whole, kept in a form
+    # that adds up: merging the aggregates of two sets of rows gives exactly
+    # the aggregates of all of them.
+    #
+    #   histograms: kind of estimate -> question -> age -> count
+    #   tallies: categorical column -> code -> count, in order of first
+    #            appearance
+
+    def __init__(self):
+        self.histograms = {
+            label: {question_slug: Counter() for question_slug in questions}
+            for label, field in ecdf_kinds}
+        self.tallies = {column: Counter() for column in categorical}
+
+    @classmethod
+    def from_responses(cls, records):
+        aggregates = cls()
+        for label, field in ecdf_kinds:
+            for question_slug in questions:
+                ages, counts = np.unique(
+                    answered(records.question(question_slug, field)),
+                    return_counts=True)
+                aggregates.histograms[label][question_slug].update(
+                    dict(zip(ages.tolist(), counts.tolist())))
+        for column, categories in categorical.items():
+            groups = Groups.from_codes(
+                records.columns[column], range(len(categories.labels)))
+            aggregates.tallies[column].update(groups.counter())
+        return aggregates
+
+    def merge(self, other):
+        for label, histograms in other.histograms.items():
+            for question_slug, histogram in histograms.items():
+                self.histograms[label][question_slug].update(histogram)
+        for column, tally in other.tallies.items():
+            self.tallies[column].update(tally)
+        return self
+
+    def tally(self, column):
+        # label -> count
+        labels = categorical[column].labels
+        counter = Counter()
+        for code, count in self.tallies[column].items():
+            counter[labels[code]] += count
+        return counter
+
+    def moments(self, label="typical"):
+        # Per question: how many answered, the sum of their answers, and the
+        # sum of squared differences from the mean.  The sums are exactly
+        # rounded, so they don't depend on how the rows were split up.
+        count, total, sum_sq = [], [], []
+        for question_slug in questions:
+            histogram = self.histograms[label][question_slug]
+            n = sum(histogram.values())
+            s = math.fsum(age * c for age, c in histogram.items())
+            mean = s / n if n else float("nan")
+            count.append(n)
+            total.append(s)
+            sum_sq.append(math.fsum(
+                c * (age - mean) ** 2 for age, c in histogram.items()))
+        return np.array(count), np.array(total), np.array(sum_sq)
+
+    def to_json(self):
+        count, total, sum_sq = self.moments()
+        return {
+            "histograms": {
+                label: {question_slug: list(histogram.items())
+                        for question_slug, histogram in histograms.items()}
+                for label, histograms in self.histograms.items()},
+            "tallies": {column: list(tally.items())
+                        for column, tally in self.tallies.items()},
+            # Derived from the histograms; here for other tools to read.
+            "moments": {
+                "count": count.tolist(),
+                "sum": total.tolist(),
+                "sum_sq": sum_sq.tolist(),
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        aggregates = cls()
+        for label, histograms in data["histograms"].items():
+            for question_slug, items in histograms.items():
+                aggregates.histograms[label][question_slug].update(
+                    dict((age, count) for age, count in items))
+        for column, items in data["tallies"].items():
+            aggregates.tallies[column].update(
+                dict((code, count) for code, count in items))
+        return aggregates
+
+def file_digest(fname, length):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(fname, "rb") as inf:
+        while length > 0:
+            block = inf.read(min(length, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+    return digest.hexdigest()
+
+def complete_lines_end(fname):
+    # The offset just past the last newline in fname, or 0 if there isn't
+    # one: anything after it may be a row that's still being written.
+    with open(fname, "rb") as inf:
+        end = inf.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - (1 << 16), 0)
+            inf.seek(start)
+            i = inf.read(end - start).rfind(b"\n")
+            if i >= 0:
+                return start + i + 1
+            end = start
+    return 0
+
+def read_incremental(fname, state_fname, chunk_size=default_chunk_size,
+                     workers=1):
+    # Like stream_responses, but reuses the cleaned rows and aggregates
+    # that the last run saved in state_fname, parses only the rows appended
+    # to fname since, and saves the merged state for next time.  If fname
+    # no longer starts with the rows we saved, or the cleaning rules have
+    # changed, parses everything again.
+    #
+    # Only whole lines are saved: a last row without its newline is read
+    # this time but parsed again next time, in case more of it was coming.
+    complete = complete_lines_end(fname)
+    if not complete:
+        # Not even the header is whole yet, so there's nothing to save.
+        records, aggregates, end = stream_responses(fname)
+        return records, aggregates
+
+    version = cleaning_version()
+    records = aggregates = None
+    if os.path.exists(state_fname):
+        with np.load(state_fname) as state:
+            meta = json.loads(str(state["meta"]))
+            if meta.get("cleaning_version") != version:
+                print("Cleaning rules changed since %s was saved; reading "
+                      "%s all again" % (state_fname, fname), file=sys.stderr)
+            elif (os.path.getsize(fname) >= meta["offset"] and
+                    file_digest(fname, meta["offset"]) == meta["digest"]):
+                records = Responses.from_answers(
+                    state["answers"],
+                    {name: state[name] for name in parsed_columns})
+                aggregates = Aggregates.from_json(meta["aggregates"])
+            else:
+                print("%s changed since %s was saved; reading it all again"
+                      % (fname, state_fname), file=sys.stderr)
+
+    if records is None:
+        records, aggregates, offset = stream_responses(
+            fname, chunk_size=chunk_size, workers=workers, stop=complete)
+    else:
+        new_records, new_aggregates, offset = stream_responses(
+            fname, meta["offset"], first_line_number=len(records) + 2,
+            chunk_size=chunk_size, workers=workers,
+            stop=max(complete, meta["offset"]))
+        print("Read %s new rows after %s saved rows" % (
+            len(new_records), len(records)), file=sys.stderr)
+        aggregates.merge(new_aggregates)
+        records = Responses.concatenate([records, new_records])
+
+    tmp_fname = state_fname + ".tmp"
+    with open(tmp_fname, "wb") as outf:
+        np.savez(outf,
+                 answers=records.answers,
+                 meta=json.dumps({
+                     "offset": offset,
+                     "digest": file_digest(fname, offset),
+                     "cleaning_version": version,
+                     "aggregates": aggregates.to_json(),
+                 }),
+                 **{name: records.columns[name] for name in parsed_columns})
+    os.replace(tmp_fname, state_fname)
+
+    if offset < os.path.getsize(fname):
+        partial_records, partial_aggregates, end = stream_responses(
+            fname, offset, first_line_number=len(records) + 2)
+        aggregates.merge(partial_aggregates)
+        records = Responses.concatenate([records, partial_records])
+    return records, aggregates
+
+# The derived columns read_cached keeps along with the parsed ones.
+cached_columns = parsed_columns + [
+    "is_parent", "mean_zscore", "mean_distance_years", "mean_percentile",
+    "percentile_spread"]
+
+def cleaning_version():
+    # A hash of the tables and code that turn a file into what read_cached
+    # keeps, so a cache is only reused when reading the file again would
+    # give the same arrays.
+    import hashlib
+    import inspect
+    digest = hashlib.sha256()
+    # getsource on a class parses the whole file, so we take their methods
+    # one by one.
+    for f in [split_line, stream_responses, chunk_ranges, parse_range,
+              merge_parts, parse_rows, is_na, clean_age, clean_age_range,
+              clean_row_cells, compute_scores, percentile_ranks, add_scores,
+              add_percentiles,
+              *[method
+                for cls in [Categories, Schema, Responses, Aggregates, Groups]
+                for method in vars(cls).values()]]:
+        if isinstance(f, classmethod):
+            f = f.__func__
+        if inspect.isfunction(f):
+            digest.update(inspect.getsource(f).encode())
+    digest.update(repr([
+        sorted(na_answers), na_prefixes, age_replacements,
+        {name: (categories.labels, sorted(categories.codes.items()))
+         for name, categories in categorical.items()},
+        questions, demographics, clarify_column, fields, cached_columns,
+    ]).encode())
+    return digest.hexdigest()
+
+def read_cached(fname, cache_dir, chunk_size=default_chunk_size, workers=1):
+    # Like stream_responses, plus add_scores and add_percentiles, but keeps
+    # the results in cache_dir under a hash of fname's contents and
+    # cleaning_version(), so a later run on the same file with the same
+    # cleaning rules loads them instead.  Loaded arrays are memory-mapped
+    # copy-on-write: nothing is read until it's used, and nothing is copied
+    # unless it's changed.
+    import hashlib
+    key = hashlib.sha256(("%s %s" % (
+        file_digest(fname, os.path.getsize(fname)),
+        cleaning_version())).encode()).hexdigest()
+    path = os.path.join(cache_dir, key)
+
+    if os.path.exists(os.path.join(path, "meta.json")):
+        with open(os.path.join(path, "meta.json")) as inf:
+            meta = json.load(inf)
+        def load(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode="c")
+        records = Responses(
+            load("answers"), {name: load(name) for name in cached_columns},
+            {field: load(fields[field])
+             for field in range(IMMATURE + 1, len(fields))})
+        print("Loaded %s rows from %s" % (len(records), path),
+              file=sys.stderr)
+        return records, Aggregates.from_json(meta["aggregates"])
+
+    records, aggregates, end = stream_responses(
+        fname, chunk_size=chunk_size, workers=workers)
+    add_scores(records, aggregates)
+    add_percentiles(records)
+
+    # Written to a temporary directory and renamed into place, so a cache
+    # that exists is always complete.
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = "%s.tmp%s" % (path, os.getpid())
+    os.makedirs(tmp_path, exist_ok=True)
+    np.save(os.path.join(tmp_path, "answers.npy"), records.answers)
+    for field, scored in records.scored.items():
+        np.save(os.path.join(tmp_path, fields[field] + ".npy"), scored)
+    for name in cached_columns:
+        np.save(os.path.join(tmp_path, name + ".npy"),
+                records.columns[name])
+    with open(os.path.join(tmp_path, "meta.json"), "w") as outf:
+        json.dump({
+            "fname": os.path.abspath(fname),
+            "rows": len(records),
+            "aggregates": aggregates.to_json(),
+        }, outf)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another run cached the same file first.
+        import shutil
+        shutil.rmtree(tmp_path)
+    return records, aggregates
+
+def cdf_lines(ecdfs):
+    # (label, xs, cumulative percentages) for each kind of estimate of one
+    # question, all over the same xs.
+    xs = np.unique(np.concatenate([ecdf.ages for ecdf in ecdfs.values()]))
+    return [(label, xs, 100 * ecdf.count_at_most(xs) / len(ecdf))
+            for label, ecdf in ecdfs.items()]
+
+def parse_query(query):
+    # "transit@9": what fraction think a 9-year-old can take transit?
+    # "transit@50%": at what age do half of respondents agree?
+    # Add ":immature" or ":mature" after the question for the other ranges.
+    #
+    # -> (target, question, kind, age or None, percentage or None)
+    target, sep, at = query.partition("@")
+    question_slug, _, label = target.partition(":")
+    label = label or "typical"
+    if not sep or not at:
+        raise Exception("Expected QUESTION@AGE or QUESTION@N%%, not %r" %
+                        query)
+    if question_slug not in question_index:
+        raise Exception("Unknown question %r in %r; choose from %s" % (
+            question_slug, query, ", ".join(questions)))
+    if label not in dict(ecdf_kinds):
+        raise Exception("Unknown kind %r in %r; choose from %s" % (
+            label, query, ", ".join(kind for kind, field in ecdf_kinds)))
+    try:
+        number = float(at[:-1] if at.endswith("%") else at)
+    except ValueError:
+        raise Exception("Expected an age or a percentage after @, not %r" %
+                        query)
+    if at.endswith("%"):
+        # age_at_fraction has no answer for none or more than all of them.
+        if not 0 < number <= 100:
+            raise Exception("Expected a percentage above 0%% and at most "
+                            "100%%, not %r" % query)
+        return target, question_slug, label, None, number
+    if not np.isfinite(number):
+        raise Exception("Expected a finite age, not %r" % query)
+    return target, question_slug, label, number, None
+
+def answer_query(ecdfs, query):
+    # See parse_query.
+    target, question_slug, label, age, percentage = parse_query(query)
+    ecdf = ecdfs[question_slug][label]
+    if percentage is not None:
+        return "%s: %.0f%% agree by age %s" % (
+            target, percentage, ecdf.age_at_fraction(percentage / 100))
+    return "%s: %.0f%% agree a %s-year-old is ready" % (
+        target, 100 * ecdf.fraction_at_most(age), query.partition("@")[2])
+
+# Figures
+#
+# Each figure is drawn by a plot_* function that only gets the precomputed
+# data it draws, so figures can render independently in worker processes.
+# Anything random takes `rng`, a numpy Generator seeded per figure.
+
+def pyplot():
+    # Always render off-screen, including in worker processes.
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+def jitter(points, row, rng):
+    # Strip plot positions for answers drawn on row `row`.  Answers are mostly
+    # whole ages, so spread each point out in proportion to how many others
+    # gave the same answer; a unique answer stays exactly where it is.
+    points = np.asarray(points, dtype=float)
+    _, inverse, counts = np.unique(
+        points, return_inverse=True, return_counts=True)
+    scale = counts[inverse] - 1
+    xs = points + rng.normal(0, scale / 150)
+    ys = row + np.clip(rng.normal(0, scale / 100), -.4, .4)
+    return xs, ys
+
+def plot_scatter(fname, xs, ys, title, xlabel, ylabel, ymax=None):
+    plt = pyplot()
+    fig, ax = plt.subplots(constrained_layout=True)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    if ymax is not None:
+        ax.set_ylim(ymin=0, ymax=ymax)
+    ax.scatter(xs, ys)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
+    plt.close()
+
+def plot_barh(fname, ys, xs, title):
+    plt = pyplot()
+    fig, ax = plt.subplots(constrained_layout=True)
+    y_pos = np.arange(len(ys))
+    ax.barh(y_pos, xs, align='center')
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(ys)
+    ax.invert_yaxis()  # labels read top-to-bottom
+    ax.set_xlabel('Respondents')
+    ax.set_title(title)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
+    plt.close()
+
+def plot_location_relation(fname, xs, ys, sizes, sorted_areas):
+    plt = pyplot()
+    fig, ax = plt.subplots(constrained_layout=True)
+    plt.xticks([n+1 for n in range(len(sorted_areas))], sorted_areas,
+               rotation=45, ha='right')
+    plt.yticks([n+1 for n in range(len(sorted_areas))], sorted_areas)
+    ax.set_xlabel('Childhood area')
+    ax.set_ylabel('Current area')
+
+    ax.set_title('Relation between current area and childhood area')
+
+    ax.scatter(xs, ys, sizes=sizes)
+
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
+    plt.close()
+
+def plot_factors(fname, labels, x, figsize, xlabel, rng, intervals=None):
+    # intervals: (low, high) lists, a confidence interval for each row's
+    # mean, drawn as error bars around the boxplot's mean marker
+    plt = pyplot()
     fig, ax = plt.subplots(constrained_layout=True, figsize=figsize)
-    x = []
-    labels = []
-    for variable in factors:
-        def include(record):
-            return record[variable] and (
-                type(record[variable]) != type(0.0) or
-                not np.isnan(record[variable])
-            ) and not np.isnan(record['mean_distance_years'])
-        for label in sorted(set(tidy_label(variable, record)
-                                for record in records
-                                if include(record)),
-                            reverse=True):
-            vals = [record['mean_distance_years']
-                    for record in records
-                    if include(record) and tidy_label(variable, record) == label]
-            if type(label) == type(()):
-                _, label = label
-
-            if label == "no kids": continue
-
-            labels.append("%s (n=%s)" % (label, len(vals)))
-            x.append(vals)
-
-        if variable != factors[-1]:
-            labels.append("")
-            x.append([])
-    box = ax.boxplot(x, labels=labels, vert=False, showfliers=False, showmeans=True)
+    box = ax.boxplot(x, labels=labels, vert=False, showfliers=False,
+                     showmeans=True)
     for _, line_list in box.items():
         for line in line_list:
             if line.get_color() != "black":
                 line.set_linewidth(line.get_linewidth() * 2)
 
     for n, points in enumerate(x):
-        xs_prejitter = points
-        ys_prejitter = [n+1 for _ in points]
-
-        xs = xs_prejitter + np.random.normal(0, 0.05, size=(len(points)))
-        ys = ys_prejitter + np.random.normal(0, 0.05, size=(len(points)))
+        xs = points + rng.normal(0, 0.05, size=len(points))
+        ys = n+1 + rng.normal(0, 0.05, size=len(points))
         ax.plot(xs, ys, 'b.', alpha=0.2)
 
-    ax.set_title("Factors predicting higher-age responses")
-    ax.set_xlabel("Mean years later than average")
-    fig.savefig("parenting-survey-factors-%s-age-distance-big.png" %
-                figlabel, dpi=180)
-    plt.close()
+    if intervals is not None:
+        low, high = intervals
+        rows = [n for n, points in enumerate(x)
+                if len(points) and not np.isnan(low[n])]
+        means = np.array([np.mean(x[n]) for n in rows])
+        ax.errorbar(
+            means, [n + 1 for n in rows],
+            xerr=[means - [low[n] for n in rows],
+                  [high[n] for n in rows] - means],
+            fmt="none", ecolor="red", elinewidth=2, capsize=4, zorder=3)
 
-"""
-for variable_name in [
-])
-    fig, ax = plt.subplots(constrained_layout=True)
-    mean_label_row = []
-    for question_slug, question_value in questions.items():
-        row = []
-        for age, count in sorted(counter[question_slug].items()):
-            for i in range(count):
-                row.append(age)
-        mean_label_row.append((np.average(row), question_slug, row))
-
-    labels = [label for (mean, label, row) in sorted(mean_label_row)]
-    x = [row for (mean, label, row) in sorted(mean_label_row)]
-    ax.set_xlim(xmin=0,xmax=18)
-    ax.boxplot(x, labels=labels, vert=False, showfliers=False)
-    ax.set_title("Estimates for a %s child" % child_label)
-    fig.savefig(child_label + "-big.png", dpi=180)
+    ax.set_title("Factors predicting higher-age responses")
+    ax.set_xlabel(xlabel)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
     plt.close()
-"""
-
-"""
-fig, ax = plt.subplots(constrained_layout=True)
-xs = defaultdict(list)
-ys = defaultdict(list)
-for i, (_, percentiles) in enumerate(sorted(person_perceniles)):
-    for percentile, question_slug in percentiles:
-        label = short_label(question_slug)
-        xs[label].append(i)
-        ys[label].append(percentile*100)
-for label in xs:
-    ax.scatter(xs[label], ys[label], label=label)
-ax.legend()
-ax.yaxis.set_major_formatter(mtick.PercentFormatter())
-ax.set_title("Relationship of each respondent to others")
-ax.set_xlabel("Respondents, from least to most cautious")
-ax.set_ylabel("Per-question percentile")
-fig.savefig("parenting-survey-individual-consistency-big.png", dpi=180)
-plt.close()
-"""
-
-# n, question_slug
-questions_by_mean_typical_age = [
-    question_slug
-    for (mean_typical_age, question_slug) in sorted(
-            (np.average([record["questions"][question_slug][0]
-                         for record in records
-                         if not np.isnan(record["questions"][
-                                 question_slug][0])]),
-             question_slug)
-            for question_slug in questions)
-]
 
-for question_slug, question_value in questions.items():
+def plot_question_cdf(fname, title, lines, labels, x, rng):
+    plt = pyplot()
+    import matplotlib.ticker as mtick
     fig, axs = plt.subplots(constrained_layout=True, nrows=2, ncols=1,
                             figsize=(10,10),
                             gridspec_kw={'height_ratios': [1, 2]},
                             sharex=True)
     ax = axs[0]
-    all_xs = set()
-    all_xs |= typicals[question_slug].keys()
-    all_xs |= earlies[question_slug].keys()
-    all_xs |= lates[question_slug].keys()
-
-    for label, counter in [
-            ("typical", typicals[question_slug]),
-            ("immature", lates[question_slug]),
-            ("mature", earlies[question_slug]),
-    ]:
-        xs = list(sorted(all_xs))
-        s = 0
-        t = sum(counter.values())
-        ys = []
-        for x in xs:
-            s += counter[x]
-            ys.append(100 * s / t)
-
+    for label, xs, ys in lines:
         ax.plot(xs, ys, label=label)
 
     ax.yaxis.set_major_formatter(mtick.PercentFormatter())
-    ax.set_title(question_value.replace(
-        ", assuming they can cross all the streets",
-        "\n(assuming they can cross all the streets)"))
+    ax.set_title(title)
     ax.legend()
 
     ax = axs[1]
-    x = []
-    labels = []
-    for variable in [
-            "childhood_area", "area", "oldest", "n_children", "gender"]:
-        def include(record):
-            return record[variable] and not np.isnan(
-                record['questions'][question_slug][0])
-
-        for label in sorted(set(tidy_label(variable, record)
-                              for record in records
-                              if include(record)),
-                          reverse=True):
-            vals = [record['questions'][question_slug][0]
-                    for record in records
-                    if include(record) and tidy_label(variable, record) == label]
-
-            if len(vals) < 3:
-                continue
-
-            if type(label) == type(()):
-                _, label = label
-
-            labels.append("%s (n=%s)" % (label, len(vals)))
-            x.append(vals)
-
-        if variable != "gender":
-            labels.append("")
-            x.append([])
     box = ax.boxplot(x, labels=labels, vert=False, showfliers=False,
                      showmeans=True)
     for _, line_list in box.items():
         for line in line_list:
             line.set_color((0,0,0,.3))
     for n, points in enumerate(x):
-        xs_prejitter = points
-        ys_prejitter = [n+1 for _ in points]
-
-        histogram = Counter()
-        for point in points:
-            histogram[point] += 1
-
-        xs = []
-        ys = []
-        for point in points:
-            xval = point
-            yval = n+1
-            jitter_scale = histogram[point] - 1
-            xval += np.random.normal(0, jitter_scale/150, size=1)[0]
-            yval += max(
-                min(np.random.normal(0, jitter_scale/100, size=1)[0],
-                    .4),
-                -.4)
-
-            xs.append(xval)
-            ys.append(yval)
-
+        xs, ys = jitter(points, n+1, rng)
         ax.plot(xs, ys, 'b.', alpha=0.2)
     ax.set_xlim(xmax=18, xmin=0)
 
-    fig.savefig("parenting-survey-cdf-" +
-                str(questions_by_mean_typical_age.index(question_slug)).zfill(2) +
-                "-" + question_slug + "-big.png", dpi=180)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
     plt.close()
 
-fig, axs = plt.subplots(constrained_layout=True, nrows=13, ncols=1,
-                        figsize=(8,24),
-                        sharey=True,
-                        sharex=True)
-for n, question_slug in enumerate(questions_by_mean_typical_age):
-    ax = axs[n]
-    all_xs = set()
-    all_xs |= typicals[question_slug].keys()
-    all_xs |= earlies[question_slug].keys()
-    all_xs |= lates[question_slug].keys()
-
-    lines = []
-    labels = []
-    for label, counter in [
-            ("typical", typicals[question_slug]),
-            ("immature", lates[question_slug]),
-            ("mature", earlies[question_slug]),
-    ]:
-        xs = list(sorted(all_xs))
-        s = 0
-        t = sum(counter.values())
-        ys = []
-        for x in xs:
-            s += counter[x]
-            ys.append(100 * s / t)
-
-        line, = ax.plot(xs, ys, label=label)
-        lines.append(line)
-        labels.append(label)
+def plot_multi_cdf(fname, titles, question_lines, highlights=None):
+    # highlights: per question, (typical age, color) pairs to mark
+    plt = pyplot()
+    import matplotlib.ticker as mtick
+    fig, axs = plt.subplots(constrained_layout=True, nrows=len(titles),
+                            ncols=1,
+                            figsize=(8,24),
+                            sharey=True,
+                            sharex=True)
+    for n, (title, lines) in enumerate(zip(titles, question_lines)):
+        ax = axs[n]
+        for label, xs, ys in lines:
+            ax.plot(xs, ys, label=label)
+
+        if highlights:
+            for typical, color in highlights[n]:
+                ax.axvline(x=typical, color=color)
+
+        ax.yaxis.set_major_formatter(mtick.PercentFormatter())
+        ax.set_title(title, loc="left", x=0.01, y=1.0, pad=-16)
+        ax.set_xlim(xmax=18, xmin=0)
+    with span("savefig"):
+        fig.savefig(fname, dpi=206)
+    plt.close()
 
-    ax.yaxis.set_major_formatter(mtick.PercentFormatter())
-    ax.set_title(questions[question_slug], loc="left", x=0.01, y=1.0, pad=-16)
-    ax.set_xlim(xmax=18, xmin=0)
-#plt.figlegend(lines, labels)
-fig.savefig("parenting-survey-multi-cdf-big.png", dpi=206)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True, nrows=1, ncols=1,
-                        figsize=(8,4),
-                        sharey=True,
-                        sharex=True)
-for n, question_slug in enumerate(questions_by_mean_typical_age):
-    if question_slug != "transit":
-        continue
-
-    all_xs = set()
-    all_xs |= typicals[question_slug].keys()
-    all_xs |= earlies[question_slug].keys()
-    all_xs |= lates[question_slug].keys()
-
-    lines = []
-    labels = []
-    for label, counter in [
-            ("typical", typicals[question_slug]),
-            ("immature", lates[question_slug]),
-            ("mature", earlies[question_slug]),
-    ]:
-        xs = list(sorted(all_xs))
-        s = 0
-        t = sum(counter.values())
-        ys = []
-        for x in xs:
-            s += counter[x]
-            ys.append(100 * s / t)
-
-        line, = ax.plot(xs, ys, label=label)
-        lines.append(line)
-        labels.append(label)
+def plot_transit_cdf(fname, lines):
+    plt = pyplot()
+    import matplotlib.ticker as mtick
+    fig, ax = plt.subplots(constrained_layout=True, nrows=1, ncols=1,
+                            figsize=(8,4),
+                            sharey=True,
+                            sharex=True)
+    for label, xs, ys in lines:
+        ax.plot(xs, ys, label=label)
 
     ax.yaxis.set_major_formatter(mtick.PercentFormatter())
     ax.set_title(
@@ -954,149 +1995,1273 @@ for n, question_slug in enumerate(questions_by_mean_typical_age):
     ax.set_xlim(xmax=18, xmin=0)
     ax.legend()
 
-fig.savefig("parenting-survey-transit-cdf-big.png", dpi=206)
-plt.close()
-
-fig, axs = plt.subplots(constrained_layout=True, nrows=13, ncols=1,
-                        figsize=(8,24),
-                        sharey=True,
-                        sharex=True)
-for n, question_slug in enumerate(questions_by_mean_typical_age):
-    ax = axs[n]
-    all_xs = set()
-    all_xs |= typicals[question_slug].keys()
-    all_xs |= earlies[question_slug].keys()
-    all_xs |= lates[question_slug].keys()
-
-    lines = []
-    labels = []
-    for label, counter in [
-            ("typical", typicals[question_slug]),
-            ("immature", lates[question_slug]),
-            ("mature", earlies[question_slug]),
-    ]:
-        xs = list(sorted(all_xs))
-        s = 0
-        t = sum(counter.values())
-        ys = []
-        for x in xs:
-            s += counter[x]
-            ys.append(100 * s / t)
-
-        line, = ax.plot(xs, ys, label=label)
-        lines.append(line)
-        labels.append(label)
-
-    for record in records:
-        if not record["highlight"]: continue
+    with span("savefig"):
+        fig.savefig(fname, dpi=206)
+    plt.close()
 
-        typical, mature, immature, *_ = record["questions"][question_slug]
-        ax.axvline(x=typical, color = record["highlight"])
+def plot_mean_ages(fname, ys, bars):
+    # bars: (label, color, mean age per question, whether to print values)
+    plt = pyplot()
+    fig, ax = plt.subplots(constrained_layout=True)
+    y_pos = np.arange(len(ys))
+    for label, color, xs, annotate in bars:
+        ax.barh(y_pos, xs, align='center', color=color, label=label)
+
+        if annotate:
+            for i in range(len(xs)):
+                plt.text(xs[i] - 0.1 , i + 0.15,
+                         "%.1f"%xs[i],
+                         horizontalalignment='right', color="w")
+    ax.set_xlim(xmin=0,xmax=18)
+    if len(bars) > 1:
+        ax.legend()
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(ys)
+    ax.invert_yaxis()  # labels read top-to-bottom
+    ax.set_xlabel('Mean age')
+    ax.set_title('Activities by age at which children typically can handle them solo',
+                 loc="left", x=-1.1)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
+    plt.close()
 
+def plot_individual_consistency(fname, points):
+    # points: (label, xs, ys) for each short_label of questions
+    plt = pyplot()
+    import matplotlib.ticker as mtick
+    fig, ax = plt.subplots(constrained_layout=True)
+    for label, xs, ys in points:
+        ax.scatter(xs, ys, label=label)
+    ax.legend()
     ax.yaxis.set_major_formatter(mtick.PercentFormatter())
-    ax.set_title(questions[question_slug], loc="left", x=0.01, y=1.0, pad=-16)
-    ax.set_xlim(xmax=18, xmin=0)
-#plt.figlegend(lines, labels)
-fig.savefig("parenting-survey-multi-cdf-highlight-big.png", dpi=206)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-ys = []
-xs = []
-for n, question_slug in enumerate(questions_by_mean_typical_age):
-    q = questions[question_slug]
-    q = q.replace(", assuming they can cross all the streets", "")
-    ys.append(q)
-    xs.append(np.mean([
-        typical_age for record in records
-        if not np.isnan(
-                typical_age := record["questions"][question_slug][0])]))
-
-y_pos = np.arange(len(ys))
-ax.barh(y_pos, xs, align='center')
-for i in range(len(xs)):
-    plt.text(xs[i] - 0.1 , i + 0.15,
-             "%.1f"%xs[i],
-             horizontalalignment='right', color="w")
-ax.set_xlim(xmin=0,xmax=18)
-ax.set_yticks(y_pos)
-ax.set_yticklabels(ys)
-ax.invert_yaxis()  # labels read top-to-bottom
-ax.set_xlabel('Mean age')
-ax.set_title('Activities by age at which children typically can handle them solo',
-             loc="left", x=-1.1)
-fig.savefig("parenting-survey-mean-typical-age-big.png", dpi=180)
-plt.close()
-
-fig, ax = plt.subplots(constrained_layout=True)
-for label, pos, color in [
-        ("immature", 2, 'C1'),
-        ("typical", 0, 'C0'),
-        ("mature", 1, 'C2'),
-]: 
-    ys = []
-    xs = []
-    for n, question_slug in enumerate(questions_by_mean_typical_age):
-        q = questions[question_slug]
-        q = q.replace(", assuming they can cross all the streets", "")
-        ys.append(q)
-        xs.append(np.mean([
-            typical_age for record in records
-            if not np.isnan(
-                    typical_age := record["questions"][question_slug][pos])]))
-    y_pos = np.arange(len(ys))
-    ax.barh(y_pos, xs, align='center', color=color, label=label)
-
-    if label != "typical":
-        for i in range(len(xs)):
-            plt.text(xs[i] - 0.1 , i + 0.15,
-                     "%.1f"%xs[i],
-                     horizontalalignment='right', color="w")
-ax.set_xlim(xmin=0,xmax=18)
-ax.legend()
-y_pos = np.arange(len(ys))
-ax.set_yticks(y_pos)
-ax.set_yticklabels(ys)
-ax.invert_yaxis()  # labels read top-to-bottom
-ax.set_xlabel('Mean age')
-ax.set_title('Activities by age at which children typically can handle them solo',
-             loc="left", x=-1.1)
-fig.savefig("parenting-survey-mean-multi-age-big.png", dpi=180)
-plt.close()
-
-for child_label, counter in [
-        ("typical", typicals),
-        ("immature", lates),
-        ("mature", earlies),
-]:
+    ax.set_title("Relationship of each respondent to others")
+    ax.set_xlabel("Respondents, from least to most cautious")
+    ax.set_ylabel("Per-question percentile")
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
+    plt.close()
+
+def plot_estimates(fname, labels, x, child_label):
+    plt = pyplot()
     fig, ax = plt.subplots(constrained_layout=True)
-    mean_label_row = []
-    for question_slug, question_value in questions.items():
-        row = []
-        for age, count in sorted(counter[question_slug].items()):
-            for i in range(count):
-                row.append(age)
-        mean_label_row.append((np.average(row), question_slug, row))
-
-    labels = [label for (mean, label, row) in sorted(mean_label_row)]
-    x = [row for (mean, label, row) in sorted(mean_label_row)]
     ax.set_xlim(xmin=0,xmax=18)
     ax.boxplot(x, labels=labels, vert=False, showfliers=False)
     ax.set_title("Estimates for a %s child" % child_label)
-    fig.savefig("parenting-survey-" + child_label + "-big.png", dpi=180)
+    with span("savefig"):
+        fig.savefig(fname, dpi=180)
     plt.close()
 
-# exporting
-import json
-records.sort(key=lambda record: record["mean_distance_years"])
-for record in records:
-    for question_slug in questions:
-        record["questions"][question_slug] = {
-            "typical": record["questions"][question_slug][0],
-            "mature": record["questions"][question_slug][1],
-            "immature": record["questions"][question_slug][2],
-            "zscore": record["questions"][question_slug][3],
-            "years_above_mean": record["questions"][question_slug][4],
-        }
-with open("export.json", "w") as outf:
-    json.dump(records, outf, sort_keys=True, indent=2)
+FigureJob = namedtuple("FigureJob", ["fname", "plot", "kwargs"])
+
+def render_figure(job, seed, outdir="."):
+    # Jitter depends only on the seed and the figure, never on which worker
+    # draws it, in what order, or where it's saved, so a fixed seed gives
+    # identical files.
+    # Returns how long it took and any profiling spans.
+    import zlib
+    import inspect
+    start = time.perf_counter()
+    with span(job.fname):
+        kwargs = dict(job.kwargs)
+        if "rng" in inspect.signature(job.plot).parameters:
+            kwargs["rng"] = np.random.default_rng(
+                [seed, zlib.crc32(job.fname.encode())])
+        job.plot(os.path.join(outdir, job.fname), **kwargs)
+    return time.perf_counter() - start, worker_spans()
+
+def render_figures(jobs, workers, seed, outdir="."):
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [render_figure(job, seed, outdir) for job in jobs]
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=start_worker,
+                initargs=worker_options() + (True,)) as pool:
+            results = list(pool.map(render_figure, jobs, [seed] * len(jobs),
+                                    [outdir] * len(jobs)))
+    for job, (seconds, spans) in zip(jobs, results):
+        if profile is not None:
+            profile.extend(spans)
+        print("  %-55s %6.2fs" % (job.fname, seconds), file=sys.stderr)
+    print("Rendered %s figures in %.2fs with %s workers" % (
+        len(jobs), time.perf_counter() - start, workers), file=sys.stderr)
+
+# Every figure figure_jobs can draw, by the name --only picks it with, and
+# what it needs computed besides the rows and aggregates: "scores" for the
+# per-respondent z-scores, "highlights" for the highlighted respondents,
+# "percentiles" for per-question percentile ranks, "intervals" for the
+# confidence intervals on group means.
+figure_needs = {
+    "age-distribution": (),
+    "age-vs-relative": ("scores",),
+    "oldest-vs-relative": ("scores",),
+    "oldest-distribution": (),
+    "caution-by-age": ("scores",),
+    "caution-by-age-of-oldest": ("scores",),
+    "current-location": (),
+    "childhood-location": (),
+    "location-relation": (),
+    "number-of-children": (),
+    "factors": ("scores", "intervals"),
+    **{"factors:%s" % figlabel: ("scores", "intervals")
+       for figlabel in ["areas", "kids", "gender", "age"]},
+    **{"cdf:%s" % question_slug: () for question_slug in questions},
+    "multi-cdf": (),
+    "transit-cdf": (),
+    "multi-cdf:highlight": ("highlights",),
+    "mean-ages:typical": (),
+    "mean-ages:multi": (),
+    **{"estimates:%s" % label: () for label, field in ecdf_kinds},
+    "individual-consistency": ("percentiles",),
+}
+
+def figure_intervals(intervals, rows, metric):
+    # (low, high) lists for plot_factors, taken from survey.intervals so
+    # figures and export-analysis.json agree: the interval on `metric` for
+    # each (variable, group) of `rows`, NaN for spacer rows and groups
+    # without one.  None without intervals.
+    if intervals is None:
+        return None
+    found = {(row["variable"], row["group"]): row["intervals"][metric]
+             for row in intervals}
+    low = []
+    high = []
+    for row in rows:
+        interval = found.get(row) or {}
+        low.append(np.nan if interval.get("low") is None else interval["low"])
+        high.append(
+            np.nan if interval.get("high") is None else interval["high"])
+    return low, high
+
+def figure_jobs(survey, names=figure_needs):
+    # Jobs for the figures in `names`, computing only what those need from
+    # the Survey.  With survey.intervals, factor figures get confidence
+    # intervals on their group means.
+    jobs = []
+    for name in names:
+        for need in figure_needs[name]:
+            getattr(survey, need)
+    records = survey.records
+    aggregates = survey.aggregates
+    ecdfs = survey.ecdfs
+
+    ages = records.columns['age']
+    oldests = records.columns['oldest']
+
+    def both(xs, ys):
+        keep = ~np.isnan(xs) & ~np.isnan(ys)
+        return xs[keep], ys[keep]
+
+    if "age-distribution" in names:
+        age_counts = Counter(answered(ages).tolist())
+        jobs.append(FigureJob(
+            "parenting-survey-age-distibution-big.png", plot_scatter, dict(
+                xs=list(age_counts), ys=list(age_counts.values()),
+                title="Age distribution of respondents",
+                xlabel="Age",
+                ylabel="Number of respondents",
+                ymax=18)))
+
+    if "age-vs-relative" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-age-vs-relative-big.png", plot_scatter, dict(
+                zip(["xs", "ys"], both(
+                    ages, records.columns['mean_distance_years'])),
+                title="Relation between age and higher-age responses",
+                xlabel="Respondent age",
+                ylabel="Mean years later than average")))
+
+    if "oldest-vs-relative" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-oldest-vs-relative-big.png", plot_scatter, dict(
+                zip(["xs", "ys"], both(
+                    oldests, records.columns['mean_distance_years'])),
+                title="Relation between age of oldest child and higher-age "
+                      "responses",
+                xlabel="Respondent's oldest child",
+                ylabel="Mean years later than average")))
+
+    if "oldest-distribution" in names:
+        oldest_counts = Counter(
+            round(oldest) for oldest in answered(oldests).tolist())
+        jobs.append(FigureJob(
+            "parenting-survey-oldest-distibution-big.png", plot_scatter, dict(
+                xs=list(oldest_counts), ys=list(oldest_counts.values()),
+                title="Distribution of the oldest child of respondents",
+                xlabel="Oldest child, if a parent",
+                ylabel="Number of respondents",
+                ymax=24)))
+
+    if "caution-by-age" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-caution-by-age-big.png", plot_scatter, dict(
+                zip(["xs", "ys"], both(
+                    ages, records.columns['mean_zscore'])),
+                title="Caution by age",
+                xlabel="Age",
+                ylabel="Caution z-score")))
+
+    if "caution-by-age-of-oldest" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-caution-by-age-of-oldest-big.png",
+            plot_scatter, dict(
+                zip(["xs", "ys"], both(
+                    oldests, records.columns['mean_zscore'])),
+                title="Caution by age of oldest child (parents only)",
+                xlabel="Age of oldest child",
+                ylabel="Caution z-score")))
+
+    areas = aggregates.tally("area")
+    sorted_areas = [area for n, area in sorted(areas)]
+    if "current-location" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-current-location-big.png", plot_barh, dict(
+                ys=sorted_areas,
+                xs=[areas[key] for key in sorted(areas)],
+                title='Location distribution of respondents')))
+
+    if "childhood-location" in names:
+        childhood_areas = aggregates.tally("childhood_area")
+        jobs.append(FigureJob(
+            "parenting-survey-childhood-location-big.png", plot_barh, dict(
+                ys=[childhood_area for n, childhood_area in
+                    sorted(childhood_areas)],
+                xs=[childhood_areas[key] for key in sorted(childhood_areas)],
+                title='Childhood location distribution of respondents')))
+
+    if "location-relation" in names:
+        area_codes = records.columns["area"].astype(np.intp)
+        childhood_area_codes = records.columns["childhood_area"].astype(
+            np.intp)
+        area_scatter_counts = Groups.from_codes(
+            np.where((area_codes == MISSING) |
+                     (childhood_area_codes == MISSING),
+                     MISSING,
+                     area_codes * len(area_categories.labels) +
+                     childhood_area_codes),
+            [(area[0], childhood_area[0])
+             for area in area_categories.labels
+             for childhood_area in area_categories.labels],
+        ).counter()
+        jobs.append(FigureJob(
+            "parenting-survey-location-relation-big.png",
+            plot_location_relation, dict(
+                xs=[x for (y, x) in area_scatter_counts],
+                ys=[y for (y, x) in area_scatter_counts],
+                sizes=[count*30 for count in area_scatter_counts.values()],
+                sorted_areas=sorted_areas)))
+
+    if "number-of-children" in names:
+        n_childrens = aggregates.tally("n_children")
+        jobs.append(FigureJob(
+            "parenting-survey-number-of-children-big.png", plot_barh, dict(
+                ys=sorted(n_childrens),
+                xs=[n_childrens[n_children]
+                    for n_children in sorted(n_childrens)],
+                title='Number of children')))
+
+    if "factors" in names:
+        x = []
+        labels = []
+        rows = []
+        for variable in [
+                "childhood_area", "area", "oldest", "n_children", "gender"]:
+            for label, vals in factor_groups(records, variable).values(
+                    records.columns['mean_zscore']):
+                if type(label) == type(()):
+                    _, label = label
+
+                labels.append("%s (n=%s)" % (label, len(vals)))
+                x.append(vals)
+                rows.append((variable, label))
+
+            if variable != "gender":
+                labels.append("")
+                x.append([])
+                rows.append(None)
+        jobs.append(FigureJob(
+            "parenting-survey-factors-big.png", plot_factors, dict(
+                labels=labels, x=x, figsize=(8,8),
+                xlabel="Mean z-score: larger values indicate higher-age "
+                       "responses",
+                intervals=figure_intervals(
+                    survey.intervals, rows, "mean_zscore"))))
+
+    for figlabel, factors, figsize in [
+            ("areas", ("childhood_area", "area"), (8,3)),
+            ("kids", ("oldest", "n_children", "is_parent"), (8,5)),
+            ("gender", ("gender", ), (8,2)),
+            ("age", ("age", ), (8,3)),
+    ]:
+        if "factors:%s" % figlabel not in names:
+            continue
+        x = []
+        labels = []
+        rows = []
+        for variable in factors:
+            for label, vals in factor_groups(
+                    records, variable, skip_nan=True).values(
+                        records.columns['mean_distance_years']):
+                if type(label) == type(()):
+                    _, label = label
+
+                if label == "no kids": continue
+
+                labels.append("%s (n=%s)" % (label, len(vals)))
+                x.append(vals)
+                rows.append((variable, label))
+
+            if variable != factors[-1]:
+                labels.append("")
+                x.append([])
+                rows.append(None)
+        jobs.append(FigureJob(
+            "parenting-survey-factors-%s-age-distance-big.png" % figlabel,
+            plot_factors, dict(
+                labels=labels, x=x, figsize=figsize,
+                xlabel="Mean years later than average",
+                intervals=figure_intervals(
+                    survey.intervals, rows, "mean_distance_years"))))
+
+    questions_by_mean_typical_age = survey.questions_by_mean_typical_age
+    lines = {
+        question_slug: cdf_lines(ecdfs[question_slug])
+        for question_slug in questions}
+
+    for question_slug, question_value in questions.items():
+        if "cdf:%s" % question_slug not in names:
+            continue
+        x = []
+        labels = []
+        for variable in [
+                "childhood_area", "area", "oldest", "n_children", "gender"]:
+            for label, vals in factor_groups(records, variable).values(
+                    records.question(question_slug)):
+                if len(vals) < 3:
+                    continue
+
+                if type(label) == type(()):
+                    _, label = label
+
+                labels.append("%s (n=%s)" % (label, len(vals)))
+                x.append(vals)
+
+            if variable != "gender":
+                labels.append("")
+                x.append([])
+
+        jobs.append(FigureJob(
+            "parenting-survey-cdf-" +
+            str(questions_by_mean_typical_age.index(question_slug)).zfill(2) +
+            "-" + question_slug + "-big.png", plot_question_cdf, dict(
+                title=question_value.replace(
+                    ", assuming they can cross all the streets",
+                    "\n(assuming they can cross all the streets)"),
+                lines=lines[question_slug], labels=labels, x=x)))
+
+    if "multi-cdf" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-multi-cdf-big.png", plot_multi_cdf, dict(
+                titles=[questions[question_slug]
+                        for question_slug in questions_by_mean_typical_age],
+                question_lines=[lines[question_slug]
+                                for question_slug in
+                                questions_by_mean_typical_age])))
+
+    if "transit-cdf" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-transit-cdf-big.png", plot_transit_cdf, dict(
+                lines=lines["transit"])))
+
+    if "multi-cdf:highlight" in names:
+        highlighted = [i for i, highlight in
+                       enumerate(records.columns["highlight"]) if highlight]
+        jobs.append(FigureJob(
+            "parenting-survey-multi-cdf-highlight-big.png", plot_multi_cdf,
+            dict(
+                titles=[questions[question_slug]
+                        for question_slug in questions_by_mean_typical_age],
+                question_lines=[lines[question_slug]
+                                for question_slug in
+                                questions_by_mean_typical_age],
+                highlights=[
+                    [(records.answers[
+                        i, question_index[question_slug], TYPICAL],
+                      records.columns["highlight"][i])
+                     for i in highlighted]
+                    for question_slug in questions_by_mean_typical_age])))
+
+    activities = [
+        questions[question_slug].replace(
+            ", assuming they can cross all the streets", "")
+        for question_slug in questions_by_mean_typical_age]
+
+    def mean_ages(field):
+        return [np.mean(answered(records.question(question_slug, field)))
+                for question_slug in questions_by_mean_typical_age]
+
+    if "mean-ages:typical" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-mean-typical-age-big.png", plot_mean_ages, dict(
+                ys=activities,
+                bars=[(None, None, mean_ages(TYPICAL), True)])))
+
+    if "mean-ages:multi" in names:
+        jobs.append(FigureJob(
+            "parenting-survey-mean-multi-age-big.png", plot_mean_ages, dict(
+                ys=activities,
+                bars=[
+                    ("immature", 'C1', mean_ages(IMMATURE), True),
+                    ("typical", 'C0', mean_ages(TYPICAL), False),
+                    ("mature", 'C2', mean_ages(MATURE), True),
+                ])))
+
+    for child_label, field in [
+            ("typical", TYPICAL),
+            ("immature", IMMATURE),
+            ("mature", MATURE),
+    ]:
+        if "estimates:%s" % child_label not in names:
+            continue
+        mean_label_row = []
+        for question_slug in questions:
+            row = np.sort(answered(records.question(question_slug, field)))
+            mean_label_row.append((np.average(row), question_slug, row))
+
+        jobs.append(FigureJob(
+            "parenting-survey-" + child_label + "-big.png", plot_estimates,
+            dict(
+                labels=[label for (mean, label, row) in
+                        sorted(mean_label_row, key=lambda x: x[:2])],
+                x=[row for (mean, label, row) in
+                   sorted(mean_label_row, key=lambda x: x[:2])],
+                child_label=child_label)))
+
+    if "individual-consistency" in names:
+        # Respondents ranked on at least two questions, by their mean rank.
+        mean = records.columns["mean_percentile"]
+        order = np.argsort(mean, kind="stable")[
+            :np.count_nonzero(~np.isnan(mean))]
+        rank = records.scored[PERCENTILE][order]
+        points = []
+        for label in dict.fromkeys(map(short_label, questions)):
+            columns = [q for q, question_slug in enumerate(questions)
+                       if short_label(question_slug) == label]
+            xs, ys = np.broadcast_to(
+                np.arange(len(order))[:, np.newaxis],
+                (len(order), len(columns))), rank[:, columns]
+            keep = ~np.isnan(ys)
+            points.append((label, xs[keep], 100 * ys[keep]))
+        jobs.append(FigureJob(
+            "parenting-survey-individual-consistency-big.png",
+            plot_individual_consistency, dict(points=points)))
+
+    return jobs
+
+def export_record(records, i):
+    record = dict(records[i])
+    values = records.respondent(i).tolist()
+    record["questions"] = {
+        question_slug: dict(zip(fields, values[q]))
+        for q, question_slug in enumerate(questions)
+    }
+    return record
+
+def null_nans(obj):
+    if isinstance(obj, float) and np.isnan(obj):
+        return None
+    if isinstance(obj, dict):
+        return {key: null_nans(val) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [null_nans(val) for val in obj]
+    return obj
+
+def write_export(outf, records, export_format="json", nan_as_null=False):
+    # Writes one record at a time, from least to most cautious (respondents
+    # who answered nothing last), so memory use doesn't grow with the export.
+    # "json" is an indented list, "jsonl" one record per line.  Plain JSON has
+    # no NaN, so strict parsers want nan_as_null.
+    order = np.argsort(records.columns["mean_distance_years"], kind="stable")
+    for n, i in enumerate(order):
+        record = export_record(records, i)
+        if nan_as_null:
+            record = null_nans(record)
+        if export_format == "jsonl":
+            outf.write(json.dumps(record, sort_keys=True) + "\n")
+            continue
+        outf.write("[\n  " if n == 0 else ",\n  ")
+        outf.write(json.dumps(record, sort_keys=True, indent=2).replace(
+            "\n", "\n  "))
+    if export_format == "json":
+        outf.write("\n]" if len(order) else "[]")
+
+# Cohorts
+#
+# A cohort is a filter over the cleaned columns, written like a Python
+# condition:
+#
+#   age >= 35 and gender == "Female" and area in ["very urban", "rural"]
+#
+# Names are the parsed demographic columns, is_parent, or a question slug
+# for its typical age.  Categorical columns compare by label and order by
+# code, so area < "suburban" is any urban area and n_children >= 3 is three
+# or more.  and, or, not, parentheses and chained comparisons work as in
+# Python, and any comparison with an unanswered value is false.  So that
+# not keeps to this, not x only matches respondents who answered every
+# column x uses: not gender == "Male" is gender != "Male".
+#
+# parse_cohort compiles one into cohort(records) -> boolean mask over the
+# respondents, evaluated against per-column indexes built once per column,
+# so a mask can select respondents for any figure or statistic (e.g. as
+# compute_scores' subset).
+
+# (color, cohort) for the highlight figure; a respondent in more than one
+# gets the color of the last.
+default_cohorts = [
+    ("b", 'age == 37 and gender == "Male" and area == "moderately urban" '
+          'and childhood_area == "slightly urban"'),
+    ("r", "age == 7"),
+    ("r", 'age == 9 and area == "moderately urban"'),
+]
+
+class SortedIndex:
+    # The respondents who answered a numeric column, in order of their
+    # answer, so a comparison is a binary search and a scatter instead of a
+    # pass over every value.
+
+    def __init__(self, vals):
+        vals = np.asarray(vals, dtype=float)
+        self.size = len(vals)
+        # NaNs sort last.
+        self.order = np.argsort(vals, kind="stable")[
+            :np.count_nonzero(~np.isnan(vals))]
+        self.sorted = vals[self.order]
+
+    def select(self, op, value):
+        if op in ("in", "not in"):
+            mask = np.zeros(self.size, dtype=bool)
+            for val in value:
+                mask |= self.select("==", val)
+            return self.answered() & ~mask if op == "not in" else mask
+        left = np.searchsorted(self.sorted, value, side="left")
+        right = np.searchsorted(self.sorted, value, side="right")
+        if op == "!=":
+            return self.select_range(0, left) | self.select_range(
+                right, len(self.order))
+        start, end = {
+            "==": (left, right),
+            "<": (0, left),
+            "<=": (0, right),
+            ">": (right, len(self.order)),
+            ">=": (left, len(self.order)),
+        }[op]
+        return self.select_range(start, end)
+
+    def select_range(self, start, end):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.order[start:end]] = True
+        return mask
+
+    def answered(self):
+        return self.select_range(0, len(self.order))
+
+class BitmapIndex:
+    # One bitmap per code of a categorical column, so a comparison is the
+    # union of the bitmaps of the codes it matches.
+
+    def __init__(self, codes, categories):
+        self.bitmaps = np.asarray(codes) == np.arange(
+            len(categories.labels))[:, np.newaxis]
+
+    def select(self, op, codes):
+        # codes: which codes match, from compile_comparison
+        return self.bitmaps[codes].any(axis=0)
+
+    def answered(self):
+        return self.bitmaps.any(axis=0)
+
+@per_responses
+def column_index(records, name):
+    with span("index %s" % name, len(records)):
+        if name in categorical:
+            return BitmapIndex(records.columns[name], categorical[name])
+        if name in questions:
+            return SortedIndex(records.question(name))
+        return SortedIndex(records.columns[name])
+
+# The names a cohort can use.
+cohort_columns = parsed_columns + ["is_parent"] + list(questions)
+
+# ast comparison -> how we write it
+comparisons = {
+    "Eq": "==", "NotEq": "!=", "Lt": "<", "LtE": "<=", "Gt": ">", "GtE": ">=",
+    "In": "in", "NotIn": "not in",
+}
+code_comparisons = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+# What each comparison becomes with its sides swapped: 7 < age is age > 7.
+swapped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "==", "!=": "!="}
+
+def parse_cohort(expression):
+    # Compiles a cohort expression (see above) into cohort(records) ->
+    # boolean mask, checking its names and labels up front.
+    import ast
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError:
+        raise Exception("Can't parse cohort %r" % expression)
+
+    def unsupported(node):
+        return Exception("Can't use %r in cohort %r" % (
+            ast.unparse(node), expression))
+
+    def compile_node(node):
+        if isinstance(node, ast.BoolOp):
+            parts = [compile_node(value) for value in node.values]
+            combine = (np.logical_and if isinstance(node.op, ast.And) else
+                       np.logical_or)
+            return lambda records: functools.reduce(
+                combine, [part(records) for part in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            part = compile_node(node.operand)
+            names = sorted({child.id for child in ast.walk(node.operand)
+                            if isinstance(child, ast.Name)})
+            return lambda records: functools.reduce(
+                np.logical_and,
+                [column_index(records, name).answered() for name in names],
+                ~part(records))
+        if isinstance(node, ast.Compare):
+            parts = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(compile_comparison(left, op, right))
+                left = right
+            return lambda records: functools.reduce(
+                np.logical_and, [part(records) for part in parts])
+        raise unsupported(node)
+
+    def compile_comparison(left, op, right):
+        op_name = comparisons.get(type(op).__name__)
+        if op_name is None:
+            raise Exception("Can't compare with %r in cohort %r; use %s" % (
+                type(op).__name__, expression, ", ".join(comparisons.values())))
+        if (not isinstance(left, ast.Name) and isinstance(right, ast.Name)
+                and op_name in swapped):
+            left, right, op_name = right, left, swapped[op_name]
+        if not isinstance(left, ast.Name):
+            raise unsupported(left)
+        if left.id not in cohort_columns:
+            raise Exception("Unknown column %r in cohort %r; choose from %s" % (
+                ast.unparse(left), expression, ", ".join(cohort_columns)))
+        name = left.id
+        try:
+            value = ast.literal_eval(right)
+        except ValueError:
+            raise unsupported(right)
+        in_list = op_name in ("in", "not in")
+        if in_list != isinstance(value, (list, tuple, set)):
+            raise unsupported(right)
+        values = value if in_list else [value]
+
+        if name not in categorical:
+            for val in values:
+                if isinstance(val, bool) or not isinstance(val, (int, float)):
+                    raise Exception("%s compares with numbers, not %r, in "
+                                    "cohort %r" % (name, val, expression))
+            return lambda records: column_index(records, name).select(
+                op_name, value)
+
+        # A categorical comparison is decided per code here, so evaluating it
+        # is just a union of bitmaps.
+        labels = [label[1] if type(label) == type(()) else label
+                  for label in categorical[name].labels]
+        targets = []
+        for val in values:
+            if "%s" % val not in labels:
+                raise Exception("Unknown %s %r in cohort %r; choose from %s" % (
+                    name, val, expression, ", ".join(labels)))
+            targets.append(labels.index("%s" % val))
+        if op_name == "in":
+            codes = sorted(set(targets))
+        elif op_name == "not in":
+            codes = [code for code in range(len(labels))
+                     if code not in targets]
+        else:
+            codes = [code for code in range(len(labels))
+                     if code_comparisons[op_name](code, targets[0])]
+        return lambda records: column_index(records, name).select(
+            op_name, codes)
+
+    return compile_node(tree.body)
+
+def parse_cohort_option(s):
+    # "COLOR=EXPRESSION" -> (color, cohort)
+    color, sep, expression = s.partition("=")
+    if not sep or not color.strip():
+        raise Exception("Expected COLOR=EXPRESSION, not %r" % s)
+    return color.strip(), parse_cohort(expression)
+
+def read_cohorts(fname):
+    # One COLOR=EXPRESSION per line; blank lines and #-comments are skipped.
+    with open(fname) as inf:
+        return [line.strip() for line in inf
+                if line.strip() and not line.lstrip().startswith("#")]
+
+def find_highlights(records, cohorts=None):
+    # Per respondent, the color to mark them with in the highlight figure,
+    # or None.  cohorts: [(color, cohort)], default_cohorts if None.
+    if cohorts is None:
+        cohorts = [(color, parse_cohort(expression))
+                   for color, expression in default_cohorts]
+    highlights = np.full(len(records), None, dtype=object)
+    for color, cohort in cohorts:
+        highlights[cohort(records)] = color
+    return highlights.tolist()
+
+def print_stats(records, aggregates, question_analysis):
+    for delta, question_slug in sorted(zip(
+            question_analysis["representativeness"], questions)):
+        print(delta, question_slug)
+
+    print("Question correlations:")
+    print("  %-13s %s" % ("", " ".join("%5.5s" % slug for slug in questions)))
+    for question_slug, row in zip(
+            questions, question_analysis["correlation"]):
+        print("  %-13s %s" % (
+            question_slug, " ".join("%5.2f" % r for r in row)))
+
+    print("Principal components:")
+    for n, (explained, loadings) in enumerate(zip(
+            question_analysis["explained_variance"],
+            question_analysis["components"])):
+        if n == 3:
+            break
+        print("  PC%s explains %.0f%%: %s" % (
+            n + 1, 100 * explained, ", ".join(
+                "%s %.2f" % (question_slug, loading)
+                for loading, question_slug in sorted(
+                    zip(loadings, questions), key=lambda x: -abs(x[0]))[:4])))
+
+    print("Responses: %s" % len(records))
+
+    print("Gender counts:")
+    genders = aggregates.tally("gender")
+    for gender in ["Male", "Female", "Non-binary"]:
+        print("  %s %s (%.0f%%)" % (
+            gender, genders[gender], 100 * genders[gender] / sum(genders.values())))    
+
+    print("Area counts:")
+    areas = aggregates.tally("area")
+    for area in areas:
+        print("  %s %s (%.0f%%)" % (
+            area, areas[area], 100 * areas[area] / sum(areas.values())))    
+
+    print("Childhood Area counts:")
+    childhood_areas = aggregates.tally("childhood_area")
+    for childhood_area in childhood_areas:
+        print("  %s %s (%.0f%%)" % (
+            childhood_area, childhood_areas[childhood_area], 100 * childhood_areas[childhood_area] / sum(childhood_areas.values())))    
+
+    print("N children counts:")
+    n_childrens = aggregates.tally("n_children")
+    for n_children in n_childrens:
+        print("  %s %s (%.0f%%)" % (
+            n_children, n_childrens[n_children], 100 * n_childrens[n_children] / sum(n_childrens.values())))    
+
+    all_ages = answered(records.columns['age'])
+    print("Median age: %s" % np.median(all_ages))
+
+    all_oldests = answered(records.columns['oldest'])
+    print("Fraction oldest under 18: %.0f%%" % (
+        100 * np.count_nonzero(all_oldests < 18) /
+        len(all_oldests)))
+
+    print("Median oldest: %s" % np.median(all_oldests))
+
+    oldest_at_birth = answered(
+        records.columns['age'] - records.columns['oldest'])
+    print("Mean age at first child: %s" % np.mean(oldest_at_birth))
+    print("Median age at first child: %s" % np.median(oldest_at_birth))
+
+# Survey
+#
+# Everything main prints, draws and exports, as an object a notebook or
+# another tool can import and ask for just what it needs:
+#
+#   survey = Survey.read("export.tsv")
+#   survey.questions_by_mean_typical_age   # reads, then a few means
+#   survey.scores.zscore                   # respondents x questions
+#   survey.cohorts = ["r=age <= 9"]       # drops only the highlights
+#
+# Each derived result is computed on first access and kept.  Whatever it
+# reads from the survey while computing is recorded as something it
+# depends on, so changing an input drops exactly the results computed from
+# it, however indirectly, and nothing else.
+
+class given:
+    # A Survey input: set when the Survey is made, or later by assigning to
+    # it, which forgets everything computed from it.
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, survey, owner=None):
+        return self if survey is None else survey.get(self.name)
+
+    def __set__(self, survey, value):
+        survey.set(**{self.name: value})
+
+class derived:
+    # Used like @property for a Survey result computed from other results
+    # and inputs.
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, survey, owner=None):
+        return self if survey is None else survey.get(self.name, self.compute)
+
+    def __set__(self, survey, value):
+        raise AttributeError("%s is computed from the Survey's inputs; set "
+                             "those instead" % self.name)
+
+class Survey:
+    records = given()       # Responses
+    cohorts = given()       # COLOR=EXPRESSION strings, None for the default
+    seed = given()          # for bootstrap and permutation draws
+    resamples = given()     # bootstrap resamples, 0 for no intervals
+    permutations = given()  # permutations per test, 0 for no tests
+    workers = given()       # processes for resampling and permuting
+
+    def __init__(self, records, aggregates=None, cohorts=None, seed=0,
+                 resamples=0, permutations=0, workers=1):
+        self.results = {}
+        # name -> the results that read it while being computed
+        self.dependents = defaultdict(set)
+        self.computing = []
+        self.set(records=records, cohorts=cohorts, seed=seed,
+                 resamples=resamples, permutations=permutations,
+                 workers=workers)
+        if aggregates is not None:
+            self.preset("aggregates", aggregates, "records")
+
+    @classmethod
+    def read(cls, fname, workers=1, chunk_size=default_chunk_size,
+             cache=None, incremental=None, **inputs):
+        # From a survey export, optionally through read_cached's cache
+        # directory or read_incremental's state file.
+        with span("read") as event:
+            if incremental:
+                records, aggregates = read_incremental(
+                    fname, incremental, chunk_size, workers)
+            elif cache:
+                records, aggregates = read_cached(
+                    fname, cache, chunk_size, workers)
+            else:
+                records, aggregates, end = stream_responses(
+                    fname, chunk_size=chunk_size, workers=workers)
+            event["rows"] = len(records)
+        survey = cls(records, aggregates, workers=workers, **inputs)
+        if cache:
+            # read_cached kept these too.
+            survey.preset("scores", kept_scores(records),
+                          "records", "aggregates")
+            survey.preset("percentiles", kept_percentiles(records), "records")
+        return survey
+
+    @classmethod
+    def from_arrays(cls, answers, columns, **inputs):
+        # From already-cleaned data: answers is respondents x questions x
+        # (typical, mature, immature) and columns holds each of
+        # parsed_columns, categorical ones as codes.
+        return cls(Responses.from_answers(answers, columns), **inputs)
+
+    def get(self, name, compute=None):
+        if self.computing:
+            self.dependents[name].add(self.computing[-1])
+        if name not in self.results:
+            self.computing.append(name)
+            try:
+                with span(name, len(self.results["records"])):
+                    self.results[name] = compute(self)
+            finally:
+                self.computing.pop()
+        return self.results[name]
+
+    def set(self, **inputs):
+        for name, value in inputs.items():
+            self.forget(name)
+            self.results[name] = value
+
+    def preset(self, name, value, *inputs):
+        # Keeps a result computed some other way from `inputs`, such as
+        # while reading, as if it had been computed here.
+        self.forget(name)
+        self.results[name] = value
+        for input_name in inputs:
+            self.dependents[input_name].add(name)
+
+    # Results also kept in records, for Record views and the export, as
+    # (scored fields, columns).
+    kept_in_records = {
+        "scores": ([ZSCORE, YEARS_ABOVE_MEAN],
+                   ["mean_zscore", "mean_distance_years"]),
+        "percentiles": ([PERCENTILE],
+                        ["mean_percentile", "percentile_spread"]),
+        "highlights": ([], ["highlight"]),
+    }
+
+    def forget(self, name):
+        # Drops name and everything computed from it.  Dependents go first,
+        # while the records they were kept in are still here to drop them
+        # from.
+        for dependent in self.dependents.pop(name, ()):
+            self.forget(dependent)
+        if name in self.results and name in self.kept_in_records:
+            records = self.results.get("records")
+            if records is not None:
+                scored, columns = self.kept_in_records[name]
+                for field in scored:
+                    records.scored.pop(field, None)
+                for column in columns:
+                    records.columns.pop(column, None)
+        self.results.pop(name, None)
+
+    def groups(self, variable, skip_nan=False):
+        return factor_groups(self.records, variable, skip_nan)
+
+    def answer(self, query):
+        # See answer_query.
+        return answer_query(self.ecdfs, query)
+
+    @derived
+    def aggregates(self):
+        # Survey.read passes in the ones built while reading instead.
+        return Aggregates.from_responses(self.records)
+
+    @derived
+    def histograms(self):
+        # kind of estimate -> question -> age -> count
+        return self.aggregates.histograms
+
+    @derived
+    def tallies(self):
+        # categorical column -> label -> count
+        return {column: self.aggregates.tally(column)
+                for column in categorical}
+
+    @derived
+    def ecdfs(self):
+        return ecdf_index(self.aggregates)
+
+    @derived
+    def questions_by_mean_typical_age(self):
+        return [question_slug for mean, question_slug in sorted(
+            (np.average(answered(self.records.question(question_slug))),
+             question_slug) for question_slug in questions)]
+
+    @derived
+    def scores(self):
+        # Also kept in records' ZSCORE and YEARS_ABOVE_MEAN fields and their
+        # mean_zscore and mean_distance_years columns.
+        return add_scores(self.records, self.aggregates)
+
+    @derived
+    def percentiles(self):
+        # Likewise in PERCENTILE, mean_percentile and percentile_spread.
+        return add_percentiles(self.records)
+
+    @derived
+    def question_analysis(self):
+        return analyze_questions(self.scores)
+
+    @derived
+    def highlights(self):
+        # Also kept in records' highlight column.
+        cohorts = None
+        if self.cohorts is not None:
+            cohorts = [parse_cohort_option(s) for s in self.cohorts]
+        highlights = find_highlights(self.records, cohorts)
+        self.records.columns["highlight"] = highlights
+        return highlights
+
+    @derived
+    def bootstrap(self):
+        # bootstrap(groups, values) -> (mean, low, high), or None
+        if self.resamples < 1:
+            return None
+        return functools.partial(
+            bootstrap_means, resamples=self.resamples, seed=self.seed,
+            workers=self.workers)
+
+    @derived
+    def intervals(self):
+        # See group_intervals; None without a bootstrap.
+        if self.bootstrap is None:
+            return None
+        self.scores  # for the score columns it reads
+        return group_intervals(self.records, self.bootstrap)
+
+    @derived
+    def tests(self):
+        # See factor_tests; None without permutations.
+        if self.permutations < 1:
+            return None
+        self.scores
+        return factor_tests(self.records, functools.partial(
+            permutation_tests, permutations=self.permutations,
+            seed=self.seed, workers=self.workers))
+
+# What main can do besides drawing figures; see --only.
+stages = ["stats", "export", "figures"]
+
+def selected_figures(selected):
+    # The figures, in drawing order, named by `selected` either exactly or
+    # by a prefix ending before a colon: "factors" is "factors" and all of
+    # "factors:areas", "factors:kids", and so on.
+    if "figures" in selected:
+        return list(figure_needs)
+    return [name for name in figure_needs
+            if any(name == s or name.startswith(s + ":") for s in selected)]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize the parenting survey and draw its figures.")
+    parser.add_argument("fname", help="tab-separated survey export")
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count(),
+        help="processes to parse the file and render figures with "
+             "(default: one per CPU)")
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="seed for the jitter in strip plots; each seed always gives the "
+             "same figures (default: 0)")
+    parser.add_argument(
+        "--query", action="append", default=[], metavar="QUESTION@AGE",
+        help="print what fraction of respondents think a child of AGE can "
+             "handle QUESTION (e.g. transit@9), or with AGE as a percentage "
+             "the age by which that many agree (e.g. transit@50%%); "
+             "may be repeated")
+    parser.add_argument(
+        "--chunk-mb", type=float, default=default_chunk_size / (1 << 20),
+        help="parse the file this many megabytes at a time; memory for "
+             "parsing grows with this instead of the file (default: "
+             "%(default)s)")
+    parser.add_argument(
+        "--incremental", metavar="STATE",
+        help="keep the cleaned rows and aggregates in STATE (an .npz file) "
+             "and on later runs only parse rows appended to fname since")
+    parser.add_argument(
+        "--cache", metavar="DIR",
+        help="keep the cleaned rows and scores in DIR, keyed by a hash of "
+             "fname and of the cleaning rules, and on later runs with the "
+             "same file and rules memory-map them instead of parsing")
+    parser.add_argument(
+        "--export-format", choices=["json", "jsonl"], default="json",
+        help="write export.json as an indented list, or export.jsonl with "
+             "one record per line")
+    parser.add_argument(
+        "--nan-as-null", action="store_true",
+        help="write missing values in the exports and export-analysis.json "
+             "as null instead of NaN, which strict JSON parsers reject")
+    parser.add_argument(
+        "--outdir", default=".",
+        help="where to write figures and exports (default: the current "
+             "directory)")
+    parser.add_argument(
+        "--resamples", type=int, default=0,
+        help="bootstrap resamples for 95%% confidence intervals on group "
+             "means in the factor figures and export-analysis.json, e.g. "
+             "10000; they take a few seconds, so by default there are none")
+    parser.add_argument(
+        "--permutations", type=int, default=0,
+        help="permutations for testing whether each factor's groups differ, "
+             "written to export-analysis.json, e.g. 10000; they take several "
+             "seconds, so by default there are no tests")
+    parser.add_argument(
+        "--cohort", action="append", default=[], metavar="COLOR=EXPRESSION",
+        help="respondents to mark in the highlight figure, e.g. "
+             "'r=age <= 9 and area < \"suburban\"', replacing the built-in "
+             "cohorts; names are columns (%s) or question slugs for their "
+             "typical age, and categorical columns compare by label; may be "
+             "repeated, and later cohorts win" % ", ".join(
+                 parsed_columns + ["is_parent"]))
+    parser.add_argument(
+        "--cohorts", metavar="FILE",
+        help="read cohorts from FILE, one COLOR=EXPRESSION per line, before "
+             "any --cohort")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="time every stage and figure, tracing memory (which slows the "
+             "run down), and print a summary at the end")
+    parser.add_argument(
+        "--trace", metavar="JSON",
+        help="like --profile, and also write the spans as a Chrome trace "
+             "(open with chrome://tracing or ui.perfetto.dev)")
+    stage_options = parser.add_mutually_exclusive_group()
+    stage_options.add_argument(
+        "--only", action="append", metavar="STAGE",
+        help="run only this stage: stats, export, figures, or a figure by "
+             "name, where a prefix like cdf or factors picks every figure "
+             "under it (e.g. cdf:transit, factors, multi-cdf); may be "
+             "repeated or comma-separated")
+    stage_options.add_argument(
+        "--no-plots", action="store_true",
+        help="print the stats and write the exports, but draw no figures")
+    stage_options.add_argument(
+        "--stats-only", action="store_true",
+        help="only print the stats")
+    stage_options.add_argument(
+        "--validate", action="store_true",
+        help="only read and clean fname, then list every answer we can't "
+             "clean with its line numbers, grouped by column and answer; "
+             "exits with status 1 if there are any")
+    args = parser.parse_args()
+
+    if args.stats_only:
+        selected = ["stats"]
+    elif args.no_plots:
+        selected = ["stats", "export"]
+    elif args.only:
+        selected = [name for only in args.only for name in only.split(",")]
+    else:
+        selected = stages
+    for name in selected:
+        if name not in stages and not selected_figures([name]):
+            parser.error("unknown stage or figure %r; choose from %s" % (
+                name, ", ".join(stages + list(figure_needs))))
+    if args.cache and args.incremental:
+        parser.error("--cache and --incremental can't be used together")
+    figures = selected_figures(selected)
+    cohorts = None
+    if args.cohorts or args.cohort:
+        try:
+            cohorts = read_cohorts(args.cohorts) if args.cohorts else []
+            cohorts += args.cohort
+            for s in cohorts:
+                parse_cohort_option(s)
+        except Exception as e:
+            parser.error(e)
+    for query in args.query:
+        try:
+            parse_query(query)
+        except Exception as e:
+            parser.error(e)
+    needs = {need for name in figures for need in figure_needs[name]}
+    if "stats" in selected or "export" in selected:
+        needs.add("scores")
+    if "export" in selected:
+        needs.add("highlights")
+        needs.add("percentiles")
+    if figures or "export" in selected:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    global profile
+    if args.profile or args.trace:
+        profile = Profile()
+    status = 0
+    with span("main"):
+        if args.validate:
+            status = validate(args)
+        else:
+            run(args, selected, figures, needs, cohorts)
+    if profile is not None:
+        print(profile.report(), file=sys.stderr)
+        if args.trace:
+            with open(args.trace, "w") as outf:
+                profile.write_trace(outf)
+    sys.exit(status)
+
+def validate(args):
+    # --validate: reads and cleans every row, reporting every answer we
+    # can't clean instead of stopping at them.  Returns the exit status.
+    start = time.perf_counter()
+    with span("read"):
+        try:
+            records, aggregates, end = stream_responses(
+                args.fname, chunk_size=int(args.chunk_mb * (1 << 20)),
+                workers=args.jobs)
+        except UnknownAnswers as e:
+            print(e.report())
+            return 1
+    print("All %s rows clean (checked in %.2fs)" % (
+        len(records), time.perf_counter() - start))
+    return 0
+
+def run(args, selected, figures, needs, cohorts=None):
+    start = time.perf_counter()
+    survey = Survey.read(
+        args.fname, args.jobs, int(args.chunk_mb * (1 << 20)),
+        cache=args.cache, incremental=args.incremental, cohorts=cohorts,
+        seed=args.seed, resamples=args.resamples,
+        permutations=args.permutations)
+    print("Read %s rows in %.2fs with %s workers" % (
+        len(survey.records), time.perf_counter() - start, args.jobs),
+        file=sys.stderr)
+
+    print(answer_cache_report(), file=sys.stderr)
+    print(memory_report(), file=sys.stderr)
+
+    for query in args.query:
+        print(survey.answer(query))
+
+    # Computed up front so they're timed on their own.
+    for need in ["scores", "percentiles", "highlights"]:
+        if need in needs:
+            getattr(survey, need)
+
+    if "stats" in selected:
+        with span("stats", len(survey.records)):
+            print_stats(survey.records, survey.aggregates,
+                        survey.question_analysis)
+
+    if figures:
+        with span("figures"):
+            with span("figure data"):
+                jobs = figure_jobs(survey, figures)
+            render_figures(jobs, args.jobs, args.seed, args.outdir)
+
+    # exporting
+    if "export" in selected:
+        records = survey.records
+        question_analysis = survey.question_analysis
+        intervals = survey.intervals
+        tests = survey.tests
+        with span("export", len(records)):
+            with open(os.path.join(
+                    args.outdir, "export." + args.export_format), "w") as outf:
+                write_export(outf, records, args.export_format,
+                             args.nan_as_null)
+
+            analysis = {
+                "questions": list(questions),
+                "representativeness":
+                    question_analysis["representativeness"].tolist(),
+                "correlation": question_analysis["correlation"].tolist(),
+                "explained_variance":
+                    question_analysis["explained_variance"].tolist(),
+                "components": question_analysis["components"].tolist(),
+                "confidence_intervals": None if intervals is None else {
+                    "level": 0.95,
+                    "resamples": args.resamples,
+                    "groups": intervals,
+                },
+                "permutation_tests": None if tests is None else {
+                    "permutations": args.permutations,
+                    "factors": tests,
+                },
+            }
+            if args.nan_as_null:
+                analysis = null_nans(analysis)
+            with open(os.path.join(
+                    args.outdir, "export-analysis.json"), "w") as outf:
+                json.dump(analysis, outf, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# Checks that the table-driven answer cleaning in process.py gives exactly what
+# the original chain of ifs and replaces did, for every rule string and every
+# answer gen_survey writes.  The original functions below are copied
+# unchanged from the first version of process.py.
+#
+#   python -m pytest test_cleaning.py
+
+import re
+import numpy as np
+
+import process
+import gen_survey
+
+def is_na(s):
+    s = s.strip()
+    return not s or s in [
+        "N/A", "N/a", "N/a--none here", "100", "110",
+        "I do not trust drivers in Somerville.",
+        "With a friend 12 Alone, unsure when he'll feel ready.",
+        "We don't have a sidewalk very close to our house",
+        "Depend on the kid maybe, depending on yard and traffic",
+    ] or any(
+        s.startswith(x) for x in [
+            "The age where they can",
+            "Different for each of these",
+            "Wouldn’t",
+            "still in utero",
+            "No sidewalk",
+            "no sidewak",
+            "no public transit",
+            "I don’t know",
+            "Depends on",
+            "legally set at 8 in my state",
+            "depends on",
+            "10? 12? so few good options here.",
+            "ha. if only they'd learned.",
+            "I don't understand this question",
+            "2I don't understand this question",
+            "with supervision, like 4",
+        ])
+
+def clean_age(s):
+    if is_na(s):
+        return float('nan')
+
+    for f, r in [
+            # Handle verbose answers
+            ("8 for our neighborhood, 6-7 for a more suburban area ",
+             "8"),
+            ("12 ? Depends on which one! I do feel like it depends on the "
+             "particular street as I think there are good and bad crossings. Ie "
+             "busy roads by highways: super dangerous; Memorial Drive — is fast "
+             "but crossings close to Harvard Sq are pretty safe for peds.",
+             "12"),
+            (
+                "I’m assuming this is unsupervised? I’m having trouble "
+                "imaging an unfenced backyard in my neighborhood. Depends "
+                "on kkd if you’re worried they’ll wander off! 3? 4? My kid "
+                "would never wander off but I know kids who are runners",
+                "3"),
+            ("I do not trust drivers in Somerville. 8", "8"),
+            ("8 except I do not trust drivers in Somerville.", "8"),
+            ("8, depends on if other adults are known to be present", "8"),
+            ("10 but more dependent on neighborhood than child", "10"),
+            ("6. This is also the legal minimum age where I live", "6"),
+            ("9 due to threat of CPS; 8 due to threat of stranger danger. "
+             "I'd let a younger child play in neighborhood woods alone.", "8"),
+            ("7 if w/in quarter mile, 9 if more like a mile", "9"),
+            ("8, but I’m not sure my kid would be ready", "8"),
+            ("12 depends on kid and environment", "12"),
+            ("12 depends on neighborhood", "12"),
+            ('7 with a crosswalk signal', "7"),
+            # remove qualifiers
+            ("(unsupervised, you mean?)", ""),
+            ("Wildly child dependent.", ""),
+            ("almost ", ""),
+            (", but depends", ""),
+            # I'm interpreting "never" to mean "not while they're a kid"
+            ("I think of McGrath and say never", "18"),
+            ("Never — this is not something I believe to be appropriate",
+            "18"),
+            ("never", "18"),
+            ("no", "18"),
+            # alterantive ways of writing things
+            ("/", "-"),
+            ("⁷", "7"),
+            # treat 8+ etc as 8
+            ("+", ""),
+            # remove uncertainty markers
+            ("?", ""),
+    ]:
+        s = s.replace(f, r)
+    s = re.sub(" [(].*[)]$", "", s)
+    s = s.strip()
+    if "-" in s:
+        return np.average([int(x) for x in s.split("-")])
+    if s.endswith(" months"):
+        return int(s.replace(" months", ""))/12
+    if s.endswith(" weeks"):
+        return int(s.replace(" weeks", ""))/52
+    if s.endswith(" years"):
+        s = s.replace(" years", "")
+    if s.endswith(" years old"):
+        s = s.replace(" years old", "")
+    return float(s)
+
+def clean_age_range(s):
+    s = s.replace("5-10 (for ~0.25 mile), 7-12 (for ~1 mile)", "7-12")
+    if is_na(s):
+        return float('nan'), float('nan')
+    s = s.replace(" to ", "-")
+    if "-" not in s and s.endswith("+"):
+        return clean_age(s[:-1]), float('nan')
+    if "-" not in s:
+        return clean_age(s), clean_age(s)
+    early, late = s.split("-")
+    return clean_age(early.strip()), clean_age(late.strip())
+
+
+def outcome(f, s):
+    # What f(s) returns, or the type of exception it raises.
+    try:
+        return repr(f(s))
+    except Exception as e:
+        return type(e).__name__
+
+def rule_strings():
+    strings = set(process.na_answers) | set(process.na_prefixes)
+    for f, r in process.age_replacements:
+        strings.update([f, r])
+    # Rules can also match inside longer answers, or depend on each other.
+    for s in list(strings):
+        strings.update([" %s " % s, "%s 8" % s, "8 %s" % s, s + "?"])
+    return strings
+
+def generated_strings():
+    typical, ranges = gen_survey.answer_tables()
+    return (set(typical.ravel()) | set(ranges.ravel()) |
+            set(gen_survey.na_answers)) - {None}
+
+edge_strings = [
+    "", " ", "8", " 8 ", "8.5", "8+", "8-10", "8 - 10", "8 to 10", "7/9",
+    "8-", "-8", "8-9-10", "almost never", "never", "no", "x no", "⁷",
+    "10 years", "10 years old", "6 months", "3 weeks", "9 (maybe)",
+    "9 (maybe) 10", "five", "12?", "?", "n/a", "N/A ", "100", "110",
+    "5-10 (for ~0.25 mile), 7-12 (for ~1 mile)",
+]
+
+def test_matches_original():
+    strings = rule_strings() | generated_strings() | set(edge_strings)
+    for s in sorted(strings):
+        assert outcome(process.is_na, s) == outcome(is_na, s), s
+        assert outcome(process.clean_age, s) == outcome(clean_age, s), s
+        assert outcome(process.clean_age_range, s) == outcome(
+            clean_age_range, s), s
@@ -0,0 +1,66 @@
+# Checks that the ways process.py can read a file all give what reading it
+# once, whole, in one process does.
+#
+#   python -m pytest test_reading.py
+
+import io
+import numpy as np
+
+import process
+import gen_survey
+
+def survey_lines(n_rows, seed=0):
+    # A synthetic export: the header, then a line per respondent.
+    outf = io.StringIO()
+    gen_survey.write_survey(outf, n_rows, gen_survey.default_mix, seed)
+    return outf.getvalue().splitlines(keepends=True)
+
+def assert_same(records, aggregates, expected_records, expected_aggregates):
+    assert len(records) == len(expected_records)
+    np.testing.assert_array_equal(records.answers, expected_records.answers)
+    for name in process.parsed_columns:
+        np.testing.assert_array_equal(
+            records.columns[name], expected_records.columns[name])
+    # Merged histograms can list ages in another order; the counts agree.
+    assert aggregates.histograms == expected_aggregates.histograms
+    assert aggregates.tallies == expected_aggregates.tallies
+
+def test_incremental_matches_full_read(tmp_path):
+    lines = survey_lines(300)
+    fname = str(tmp_path / "survey.tsv")
+    state_fname = str(tmp_path / "state.npz")
+
+    def check():
+        records, aggregates = process.read_incremental(fname, state_fname)
+        expected_records, expected_aggregates, end = \
+            process.stream_responses(fname)
+        assert_same(records, aggregates, expected_records,
+                    expected_aggregates)
+
+    with open(fname, "w") as outf:
+        outf.writelines(lines[:201])
+    check()
+
+    # Rows appended since, the last still waiting for its newline.
+    with open(fname, "a") as outf:
+        outf.writelines(lines[201:])
+        outf.write(lines[-1].rstrip("\n"))
+    check()
+
+    # The rest of that row.
+    with open(fname, "a") as outf:
+        outf.write("more to say\n")
+    check()
+
+def test_workers_match_one_process(tmp_path):
+    fname = str(tmp_path / "survey.tsv")
+    with open(fname, "w") as outf:
+        outf.writelines(survey_lines(500))
+
+    expected_records, expected_aggregates, expected_end = \
+        process.stream_responses(fname)
+    # Small chunks, so every worker gets several.
+    records, aggregates, end = process.stream_responses(
+        fname, chunk_size=4096, workers=3)
+    assert end == expected_end
+    assert_same(records, aggregates, expected_records, expected_aggregates)